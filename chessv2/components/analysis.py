@@ -0,0 +1,160 @@
+'''This module analyses large sets of positions read from FEN or EPD files and writes one JSON line per position
+Positions are streamed through a process pool with a bounded number of batches in flight, so memory stays flat
+however large the input is. Run it from the repository root with: python -m chessv2.components.analysis --help'''
+from __future__ import annotations
+import argparse
+import gzip
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Final, Iterable, Iterator, NamedTuple, TextIO
+from .board import Board
+from .bitboard import generate_legal_moves, move_to_uci
+from .parallel import WorkerState, default_workers, worker_pool, worker_state
+from .search import Search, SearchResult
+from .tablebase import Tablebase, ProbeResult
+from .transposition import TranspositionTable
+
+# Positions sent to a worker at a time, large enough that pickling is a small share of the work
+BATCH_SIZE: Final[int] = 64
+# Batches queued per worker, the only positions held in memory besides the one being written
+BATCHES_IN_FLIGHT: Final[int] = 2
+
+class Position(NamedTuple):
+    '''A position read from an input file, id is the EPD id operation if it had one'''
+    line: int
+    fen: str
+    id: str
+
+def open_positions(path: str) -> TextIO:
+    '''Opens a position file for streaming, '-' reads standard input and .gz files are decompressed on the fly'''
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+def parse_line(line: str) -> tuple[str, str] | None:
+    '''Returns the FEN and id of a FEN or EPD line, or None for blank lines and comments
+    EPD lines have four fields followed by operations such as bm and id, their clocks come from the
+    hmvc and fmvn operations when present'''
+    line = line.strip()
+    if not line or line[0] == '#':
+        return None
+    fields: list[str] = line.split(None, 4)
+    if len(fields) < 4:
+        return line, None
+    rest: str = fields[4] if len(fields) > 4 else ''
+    clocks: list[str] = rest.split(None, 2)[:2]
+    if len(clocks) == 2 and clocks[0].isdigit() and clocks[1].isdigit():
+        return ' '.join(fields[:4] + clocks), None
+    operations: dict[str, str] = {}
+    for operation in rest.split(';'):
+        opcode, _, operand = operation.strip().partition(' ')
+        if opcode:
+            operations[opcode] = operand.strip().strip('"')
+    fen: str = ' '.join(fields[:4] + [operations.get('hmvc', '0'), operations.get('fmvn', '1')])
+    return fen, operations.get('id')
+
+def read_positions(paths: Iterable[str]) -> Iterator[Position]:
+    '''Yields the positions of each file in order, one line at a time'''
+    for path in paths:
+        with open_positions(path) as positions:
+            for number, line in enumerate(positions, start=1):
+                parsed: tuple[str, str] | None = parse_line(line)
+                if parsed is not None:
+                    yield Position(number, parsed[0], parsed[1])
+
+def batched(positions: Iterable[Position], size: int = BATCH_SIZE) -> Iterator[list[Position]]:
+    '''Groups positions into lists of at most size'''
+    batch: list[Position] = []
+    for position in positions:
+        batch.append(position)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def analyse(board: Board, table: TranspositionTable, fen: str, depth: int, time_limit: float = None,
+            node_limit: int = None, tablebase: Tablebase = None) -> dict:
+    '''Loads a FEN and returns its best move, score and legal move count as a dict ready for JSON
+    Positions the tablebase covers also get their win, draw or loss and distance to mate in plies'''
+    board.fen_to_board(fen, views=False)
+    legal_moves: int = len(generate_legal_moves(board))
+    result: SearchResult = Search(board, table, tablebase).search(depth, time_limit, node_limit)
+    record: dict = {'fen': fen, 'best_move': move_to_uci(result.move) if result.move else None,
+                    'score': result.score, 'depth': result.depth, 'nodes': result.nodes, 'legal_moves': legal_moves}
+    probe: ProbeResult | None = tablebase.probe(board) if tablebase is not None else None
+    if probe is not None:
+        record['wdl'] = probe.wdl
+        record['mate_distance'] = probe.distance
+    return record
+
+def _analyse_batch(batch: list[Position], depth: int, time_limit: float, node_limit: int) -> list[dict]:
+    '''Analyses a batch in a worker, a position that does not parse gets an error instead of a result'''
+    results: list[dict] = []
+    worker: WorkerState = worker_state()
+    for position in batch:
+        try:
+            record: dict = analyse(worker.board, worker.table, position.fen, depth, time_limit, node_limit,
+                                   worker.tablebase)
+        except ValueError as error:
+            record = {'fen': position.fen, 'error': str(error)}
+        record['line'] = position.line
+        if position.id is not None:
+            record['id'] = position.id
+        results.append(record)
+    return results
+
+def analyse_positions(positions: Iterable[Position], depth: int = 3, time_limit: float = None,
+                      node_limit: int = None, workers: int = None, table_megabytes: float = 4,
+                      tablebase_directory: str = None) -> Iterator[dict]:
+    '''Yields a result for every position in input order while the pool works on the batches after it
+    At most BATCHES_IN_FLIGHT batches per worker are read ahead, the tablebases are mapped by every worker'''
+    workers = workers or default_workers()
+    with worker_pool(workers, table_megabytes, tablebase_directory) as pool:
+        pending: deque[Future] = deque()
+        for batch in batched(positions):
+            pending.append(pool.submit(_analyse_batch, batch, depth, time_limit, node_limit))
+            if len(pending) >= workers * BATCHES_IN_FLIGHT:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def write_jsonl(results: Iterable[dict], out: TextIO) -> int:
+    '''Writes each result as a JSON line as soon as it arrives and returns how many were written'''
+    count: int = 0
+    for record in results:
+        out.write(json.dumps(record, separators=(',', ':')) + '\n')
+        count += 1
+    return count
+
+def main(argv: list[str] = None) -> int:
+    '''Parses the command line and analyses every position of the input files'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Analyse FEN or EPD files to JSON lines')
+    parser.add_argument('inputs', nargs='+', help="FEN or EPD files, optionally gzipped, '-' reads standard input")
+    parser.add_argument('-o', '--output', default='-', help="JSON lines file to write, '-' writes standard output")
+    parser.add_argument('--depth', type=int, default=3, help='depth to search each position to')
+    parser.add_argument('--time', type=float, help='seconds to spend on each position at most')
+    parser.add_argument('--nodes', type=int, help='nodes to spend on each position at most')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes, 0 uses every core')
+    parser.add_argument('--tablebase', help='directory of endgame tables made by components/tablebase.py')
+    args: argparse.Namespace = parser.parse_args(argv)
+    start: float = time.perf_counter()
+    out: TextIO = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        count: int = write_jsonl(analyse_positions(read_positions(args.inputs), args.depth, args.time, args.nodes,
+                                                   args.workers or None, tablebase_directory=args.tablebase), out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed: float = time.perf_counter() - start
+    print(f'{count} positions in {elapsed:.3f}s, {count / elapsed if elapsed else 0:.1f} positions/s',
+          file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+'''This module keeps a count of the attackers of every square for both colors, updated as moves are made
+Only the pieces on the squares a move touches and the sliders whose rays reach those squares are recomputed,
+so checks, king safety and castling paths are answered by looking a count up'''
+from __future__ import annotations
+from typing import Final, TYPE_CHECKING
+from .bitboard import WHITE, BLACK, BOTH, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, SQUARE_MASKS, KNIGHT_ATTACKS, \
+    KING_ATTACKS, PAWN_ATTACKS, RAY_MASKS, EP_CAPTURE, KING_CASTLE, QUEEN_CASTLE, bishop_attacks, rook_attacks, \
+    queen_attacks
+if TYPE_CHECKING:
+    from .board import Board
+
+# Slider piece codes of both colors
+_SLIDERS: Final[tuple] = tuple(color << 3 | kind for color in (WHITE, BLACK) for kind in (BISHOP, ROOK, QUEEN))
+# Squares sharing a rank, file or diagonal with each square, the only places a slider reaching it can stand
+_LINES: Final[tuple] = tuple(sum(masks) for masks in RAY_MASKS)
+
+def piece_attacks(code: int, square: int, occupied: int) -> int:
+    '''Returns the squares the piece code on a square attacks'''
+    kind: int = code & 7
+    if kind == PAWN:
+        return PAWN_ATTACKS[code >> 3][square]
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if kind == KING:
+        return KING_ATTACKS[square]
+    if kind == BISHOP:
+        return bishop_attacks(square, occupied)
+    if kind == ROOK:
+        return rook_attacks(square, occupied)
+    return queen_attacks(square, occupied)
+
+def move_squares(move: int, color: int) -> int:
+    '''Returns the squares whose contents an encoded move of the given color changes'''
+    end: int = move >> 6 & 63
+    flag: int = move >> 12
+    squares: int = SQUARE_MASKS[move & 63] | SQUARE_MASKS[end]
+    if flag == EP_CAPTURE:
+        squares |= SQUARE_MASKS[end + 8 if color == WHITE else end - 8]
+    elif flag == KING_CASTLE:
+        squares |= SQUARE_MASKS[end + 1] | SQUARE_MASKS[end - 1]
+    elif flag == QUEEN_CASTLE:
+        squares |= SQUARE_MASKS[end - 2] | SQUARE_MASKS[end + 1]
+    return squares
+
+# Binary digits of the counts, enough for all 16 pieces of a color attacking one square
+COUNT_BITS: Final[int] = 5
+
+def _add(planes: list[int], squares: int) -> None:
+    '''Adds one to the count of every square of a bitboard, carrying from digit to digit'''
+    for digit in range(COUNT_BITS):
+        if not squares:
+            return
+        plane: int = planes[digit]
+        planes[digit] = plane ^ squares
+        squares &= plane
+
+def _subtract(planes: list[int], squares: int) -> None:
+    '''Subtracts one from the count of every square of a bitboard, borrowing from digit to digit'''
+    for digit in range(COUNT_BITS):
+        if not squares:
+            return
+        plane: int = planes[digit]
+        planes[digit] = plane ^ squares
+        squares &= ~plane
+
+class AttackMap:
+    '''Number of pieces of each color attacking each square, with the attacks of every piece it was built from
+    The counts are bit sliced: digit i of every square's count is bit square of planes[color][i], so a piece's
+    whole attack set is added or removed with a few operations on bitboards rather than one per square
+    Board.make_move and Board.unmake_move keep it in step once Board.track_attacks has created it'''
+    __slots__ = ('planes', 'attacked', 'attacks', 'codes')
+    planes: tuple[list[int], list[int]]
+    attacked: list[int]
+    attacks: list[int]
+    codes: bytearray
+    def __init__(self, board: Board) -> None:
+        '''Counts the attacks of every piece on the board'''
+        self.planes: tuple[list[int], list[int]] = ([0] * COUNT_BITS, [0] * COUNT_BITS)
+        # squares attacked at least once by each color
+        self.attacked: list[int] = [0, 0]
+        # squares attacked by the piece on each square and the piece code they were computed for
+        self.attacks: list[int] = [0] * 64
+        self.codes: bytearray = bytearray(64)
+        self.update(board, board.occupancy[BOTH])
+
+    def update(self, board: Board, changed: int) -> None:
+        '''Brings the counts up to date after the contents of the changed squares were altered
+        A slider's attacks can only change when one of the squares it attacked did, so other sliders are kept'''
+        attacks: list[int] = self.attacks
+        codes: bytearray = self.codes
+        planes: tuple[list[int], list[int]] = self.planes
+        squares: bytearray = board.squares
+        bitboards: list[int] = board.bitboards
+        occupied: int = board.occupancy[BOTH]
+        affected: int = changed
+        lines: int = 0
+        squares_left: int = changed
+        while squares_left:
+            low: int = squares_left & -squares_left
+            lines |= _LINES[low.bit_length() - 1]
+            squares_left ^= low
+        sliders: int = 0
+        for code in _SLIDERS:
+            sliders |= bitboards[code]
+        sliders &= lines & ~changed
+        while sliders:
+            low = sliders & -sliders
+            if attacks[low.bit_length() - 1] & changed:
+                affected |= low
+            sliders ^= low
+        while affected:
+            low = affected & -affected
+            square: int = low.bit_length() - 1
+            affected ^= low
+            old_code: int = codes[square]
+            old: int = attacks[square]
+            code: int = squares[square]
+            new: int = piece_attacks(code, square, occupied) if code else 0
+            if old_code and code and old_code >> 3 == code >> 3:
+                if old != new:
+                    _subtract(planes[code >> 3], old & ~new)
+                    _add(planes[code >> 3], new & ~old)
+            else:
+                if old_code:
+                    _subtract(planes[old_code >> 3], old)
+                if code:
+                    _add(planes[code >> 3], new)
+            attacks[square] = new
+            codes[square] = code
+        for color in (WHITE, BLACK):
+            digits: list[int] = planes[color]
+            self.attacked[color] = digits[0] | digits[1] | digits[2] | digits[3] | digits[4]
+
+    def count(self, color: int, square: int) -> int:
+        '''Returns how many pieces of the given color attack a square'''
+        total: int = 0
+        for digit, plane in enumerate(self.planes[color]):
+            total |= (plane >> square & 1) << digit
+        return total
+
+    def is_attacked(self, color: int, square: int) -> bool:
+        '''Returns True if any piece of the given color attacks a square'''
+        return bool(self.attacked[color] >> square & 1)
+
+    def in_check(self, board: Board, color: int) -> bool:
+        '''Returns True if the king of the given color is attacked'''
+        return bool(self.attacked[color ^ 1] & board.bitboards[color << 3 | KING])
+
+    def king_zone_attacks(self, board: Board, color: int) -> int:
+        '''Returns the number of enemy attacks on the king of the given color and the squares around it'''
+        king: int = board.bitboards[color << 3 | KING]
+        if not king:
+            return 0
+        zone: int = king | KING_ATTACKS[king.bit_length() - 1]
+        return sum((plane & zone).bit_count() << digit for digit, plane in enumerate(self.planes[color ^ 1]))
+
+    def attacked_squares(self, board: Board, color: int) -> int:
+        '''Returns a bitboard of every square the given color attacks'''
+        return self.attacked[color]
@@ -0,0 +1,408 @@
+'''This module stores the bitboard backend: piece codes, move encoding, attack masks and move generation
+Bit n of a bitboard is square n of Board.board, so bit 0 is a8 and bit 63 is h1'''
+from __future__ import annotations
+from typing import Final
+from .metrics import METRICS, MOVE_GENERATIONS
+from .tables import KNIGHT_MOVES, KING_MOVES, RAYS, DIRECTION_OFFSETS, BISHOP_DIRECTIONS, ROOK_DIRECTIONS
+
+WHITE: Final[int] = 0
+BLACK: Final[int] = 1
+BOTH: Final[int] = 2
+
+EMPTY: Final[int] = 0
+PAWN: Final[int] = 1
+KNIGHT: Final[int] = 2
+BISHOP: Final[int] = 3
+ROOK: Final[int] = 4
+QUEEN: Final[int] = 5
+KING: Final[int] = 6
+
+# A piece code packs the color above the piece type, so code >> 3 is the color and code & 7 the type
+FEN_TO_CODE: Final[dict] = {'P': PAWN, 'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING,
+                            'p': BLACK << 3 | PAWN, 'n': BLACK << 3 | KNIGHT, 'b': BLACK << 3 | BISHOP,
+                            'r': BLACK << 3 | ROOK, 'q': BLACK << 3 | QUEEN, 'k': BLACK << 3 | KING}
+CODE_TO_FEN: Final[dict] = {code: char for char, code in FEN_TO_CODE.items()}
+
+# Castling rights are a 4 bit mask
+WHITE_KING_SIDE: Final[int] = 1
+WHITE_QUEEN_SIDE: Final[int] = 2
+BLACK_KING_SIDE: Final[int] = 4
+BLACK_QUEEN_SIDE: Final[int] = 8
+ALL_CASTLING: Final[int] = 15
+FEN_CASTLING: Final[dict] = {'K': WHITE_KING_SIDE, 'Q': WHITE_QUEEN_SIDE, 'k': BLACK_KING_SIDE, 'q': BLACK_QUEEN_SIDE}
+
+# Moves are 16 bit integers: from square, to square and a 4 bit flag
+QUIET: Final[int] = 0
+DOUBLE_PUSH: Final[int] = 1
+KING_CASTLE: Final[int] = 2
+QUEEN_CASTLE: Final[int] = 3
+CAPTURE: Final[int] = 4
+EP_CAPTURE: Final[int] = 5
+PROMOTION: Final[int] = 8
+# The low two bits of a promotion flag pick the piece, knight through queen
+PROMOTION_PIECES: Final[tuple] = (KNIGHT, BISHOP, ROOK, QUEEN)
+
+FULL: Final[int] = 0xFFFFFFFFFFFFFFFF
+FILE_A: Final[int] = 0x0101010101010101
+FILE_H: Final[int] = 0x8080808080808080
+RANK_8: Final[int] = 0xFF
+RANK_1: Final[int] = 0xFF << 56
+# The squares a single pawn push lands on when a double push is still possible
+WHITE_DOUBLE_RANK: Final[int] = 0xFF << 40
+BLACK_DOUBLE_RANK: Final[int] = 0xFF << 16
+
+WHITE_KING_START: Final[int] = 60
+BLACK_KING_START: Final[int] = 4
+
+def encode_move(start: int, end: int, flag: int = QUIET) -> int:
+    '''Packs a move into a 16 bit integer'''
+    return start | end << 6 | flag << 12
+
+def move_from(move: int) -> int:
+    '''Returns the starting square of a move'''
+    return move & 63
+
+def move_to(move: int) -> int:
+    '''Returns the destination square of a move'''
+    return move >> 6 & 63
+
+def move_flag(move: int) -> int:
+    '''Returns the flag of a move'''
+    return move >> 12
+
+def square_name(square: int) -> str:
+    '''Returns the algebraic name of a square, a8 being square 0'''
+    return 'abcdefgh'[square & 7] + str(8 - (square >> 3))
+
+def parse_square(name: str) -> int:
+    '''Returns the square of an algebraic name such as e4'''
+    return (8 - int(name[1])) * 8 + 'abcdefgh'.index(name[0])
+
+def move_to_uci(move: int) -> str:
+    '''Returns a move in long algebraic notation, such as e2e4 or e7e8q'''
+    text: str = square_name(move & 63) + square_name(move >> 6 & 63)
+    if move >> 12 & PROMOTION:
+        text += 'nbrq'[move >> 12 & 3]
+    return text
+
+def _mask(squares: tuple) -> int:
+    '''Turns a collection of squares into a bitboard'''
+    bitboard: int = 0
+    for square in squares:
+        bitboard |= 1 << square
+    return bitboard
+
+def _pawn_attack_mask(color: int, square: int) -> int:
+    '''Returns the squares a pawn of the given color attacks from a square'''
+    row, col = divmod(square, 8)
+    row += -1 if color == WHITE else 1
+    if not 0 <= row < 8:
+        return 0
+    return _mask(tuple(row * 8 + target for target in (col - 1, col + 1) if 0 <= target < 8))
+
+SQUARE_MASKS: Final[tuple] = tuple(1 << square for square in range(64))
+# The light squares, a8 among them
+LIGHT_SQUARES: Final[int] = _mask(tuple(square for square in range(64) if not (square >> 3) + square & 1))
+KNIGHT_ATTACKS: Final[tuple] = tuple(_mask(targets) for targets in KNIGHT_MOVES)
+KING_ATTACKS: Final[tuple] = tuple(_mask(targets) for targets in KING_MOVES)
+PAWN_ATTACKS: Final[tuple] = tuple(tuple(_pawn_attack_mask(color, square) for square in range(64))
+                                   for color in (WHITE, BLACK))
+RAY_MASKS: Final[tuple] = tuple(tuple(_mask(ray) for ray in rays) for rays in RAYS)
+# Rays that run towards higher square numbers are blocked by their lowest set bit, the rest by their highest
+_ROOK_RAYS: Final[tuple] = tuple((direction, DIRECTION_OFFSETS[direction] > 0) for direction in ROOK_DIRECTIONS)
+_BISHOP_RAYS: Final[tuple] = tuple((direction, DIRECTION_OFFSETS[direction] > 0) for direction in BISHOP_DIRECTIONS)
+
+def _between_masks() -> tuple:
+    '''Builds the squares strictly between two squares that share a line, empty when they do not'''
+    table: list = [[0] * 64 for _ in range(64)]
+    for square, rays in enumerate(RAYS):
+        for ray in rays:
+            between: int = 0
+            for target in ray:
+                table[square][target] = between
+                between |= 1 << target
+    return tuple(tuple(row) for row in table)
+
+BETWEEN: Final[tuple] = _between_masks()
+
+# Castling rights that survive a move touching the square
+CASTLING_RIGHTS: Final[tuple] = tuple(
+    ALL_CASTLING & ~{60: WHITE_KING_SIDE | WHITE_QUEEN_SIDE, 63: WHITE_KING_SIDE, 56: WHITE_QUEEN_SIDE,
+                     4: BLACK_KING_SIDE | BLACK_QUEEN_SIDE, 7: BLACK_KING_SIDE, 0: BLACK_QUEEN_SIDE}.get(square, 0)
+    for square in range(64))
+
+def _slider_attacks(square: int, occupied: int, rays: tuple) -> int:
+    '''Returns the squares a slider attacks along the given rays, stopping at the first blocker'''
+    attacks: int = 0
+    masks: tuple = RAY_MASKS[square]
+    for direction, positive in rays:
+        ray: int = masks[direction]
+        blockers: int = ray & occupied
+        if blockers:
+            blocker: int = (blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1
+            ray ^= RAY_MASKS[blocker][direction]
+        attacks |= ray
+    return attacks
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    '''Returns the squares a bishop attacks from a square'''
+    return _slider_attacks(square, occupied, _BISHOP_RAYS)
+
+def rook_attacks(square: int, occupied: int) -> int:
+    '''Returns the squares a rook attacks from a square'''
+    return _slider_attacks(square, occupied, _ROOK_RAYS)
+
+def queen_attacks(square: int, occupied: int) -> int:
+    '''Returns the squares a queen attacks from a square'''
+    return _slider_attacks(square, occupied, _ROOK_RAYS) | _slider_attacks(square, occupied, _BISHOP_RAYS)
+
+def attackers_to(board: object, square: int, color: int, occupied: int = -1) -> int:
+    '''Returns a bitboard of the pieces of the given color attacking a square'''
+    bitboards: list[int] = board.bitboards
+    base: int = color << 3
+    if occupied == -1:
+        occupied = board.occupancy[BOTH]
+    queens: int = bitboards[base | QUEEN]
+    return (PAWN_ATTACKS[color ^ 1][square] & bitboards[base | PAWN]
+            | KNIGHT_ATTACKS[square] & bitboards[base | KNIGHT]
+            | KING_ATTACKS[square] & bitboards[base | KING]
+            | bishop_attacks(square, occupied) & (bitboards[base | BISHOP] | queens)
+            | rook_attacks(square, occupied) & (bitboards[base | ROOK] | queens))
+
+def is_square_attacked(board: object, square: int, color: int) -> bool:
+    '''Returns True if any piece of the given color attacks a square'''
+    bitboards: list[int] = board.bitboards
+    base: int = color << 3
+    if PAWN_ATTACKS[color ^ 1][square] & bitboards[base | PAWN] or KNIGHT_ATTACKS[square] & bitboards[base | KNIGHT] \
+            or KING_ATTACKS[square] & bitboards[base | KING]:
+        return True
+    occupied: int = board.occupancy[BOTH]
+    queens: int = bitboards[base | QUEEN]
+    if bitboards[base | BISHOP] | queens and bishop_attacks(square, occupied) & (bitboards[base | BISHOP] | queens):
+        return True
+    return bool(bitboards[base | ROOK] | queens and rook_attacks(square, occupied) & (bitboards[base | ROOK] | queens))
+
+def attacked_squares(board: object, color: int) -> int:
+    '''Returns a bitboard of every square the given color attacks'''
+    bitboards: list[int] = board.bitboards
+    base: int = color << 3
+    occupied: int = board.occupancy[BOTH]
+    attacks: int = 0
+    for kind, table in ((PAWN, PAWN_ATTACKS[color]), (KNIGHT, KNIGHT_ATTACKS), (KING, KING_ATTACKS)):
+        pieces: int = bitboards[base | kind]
+        while pieces:
+            low: int = pieces & -pieces
+            attacks |= table[low.bit_length() - 1]
+            pieces ^= low
+    for kind, attack_function in ((BISHOP, bishop_attacks), (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+        pieces = bitboards[base | kind]
+        while pieces:
+            low = pieces & -pieces
+            attacks |= attack_function(low.bit_length() - 1, occupied)
+            pieces ^= low
+    return attacks
+
+def _add_targets(moves: list, start: int, targets: int, enemies: int) -> None:
+    '''Appends a move to every target square, flagging the ones that capture'''
+    while targets:
+        low: int = targets & -targets
+        moves.append(start | (low.bit_length() - 1) << 6 | (CAPTURE << 12 if low & enemies else 0))
+        targets ^= low
+
+def _add_pawn_moves(moves: list, targets: int, offset: int, flag: int, promotions: int) -> None:
+    '''Appends pawn moves reaching each target from target - offset, expanding promotions'''
+    while targets:
+        low: int = targets & -targets
+        end: int = low.bit_length() - 1
+        targets ^= low
+        move: int = (end - offset) | end << 6
+        if low & promotions:
+            for promotion in range(4):
+                moves.append(move | (PROMOTION | flag & CAPTURE | promotion) << 12)
+        else:
+            moves.append(move | flag << 12)
+
+def _add_pawn_set(moves: list, color: int, pawns: int, empty: int, enemies: int, allowed: int) -> None:
+    '''Appends the pushes and captures of a set of pawns that land on an allowed square'''
+    if color == WHITE:
+        single: int = pawns >> 8 & empty
+        _add_pawn_moves(moves, single & allowed, -8, QUIET, RANK_8)
+        _add_pawn_moves(moves, (single & WHITE_DOUBLE_RANK) >> 8 & empty & allowed, -16, DOUBLE_PUSH, 0)
+        _add_pawn_moves(moves, (pawns & ~FILE_A) >> 9 & enemies & allowed, -9, CAPTURE, RANK_8)
+        _add_pawn_moves(moves, (pawns & ~FILE_H) >> 7 & enemies & allowed, -7, CAPTURE, RANK_8)
+    else:
+        single = pawns << 8 & empty
+        _add_pawn_moves(moves, single & allowed, 8, QUIET, RANK_1)
+        _add_pawn_moves(moves, (single & BLACK_DOUBLE_RANK) << 8 & empty & allowed, 16, DOUBLE_PUSH, 0)
+        _add_pawn_moves(moves, (pawns & ~FILE_A) << 7 & enemies & allowed, 7, CAPTURE, RANK_1)
+        _add_pawn_moves(moves, (pawns & ~FILE_H) << 9 & enemies & allowed, 9, CAPTURE, RANK_1)
+
+def generate_moves(board: object) -> list[int]:
+    '''Generates the pseudo legal moves for the side to move, castling only through unattacked squares'''
+    moves: list[int] = []
+    bitboards: list[int] = board.bitboards
+    occupancy: list[int] = board.occupancy
+    color: int = board.side
+    base: int = color << 3
+    own: int = occupancy[color]
+    enemies: int = occupancy[color ^ 1]
+    occupied: int = occupancy[BOTH]
+    pawns: int = bitboards[base | PAWN]
+    _add_pawn_set(moves, color, pawns, ~occupied & FULL, enemies, FULL)
+    if board.ep_square != -1:
+        capturers: int = PAWN_ATTACKS[color ^ 1][board.ep_square] & pawns
+        while capturers:
+            low: int = capturers & -capturers
+            moves.append((low.bit_length() - 1) | board.ep_square << 6 | EP_CAPTURE << 12)
+            capturers ^= low
+    for kind, table in ((KNIGHT, KNIGHT_ATTACKS), (KING, KING_ATTACKS)):
+        pieces: int = bitboards[base | kind]
+        while pieces:
+            low = pieces & -pieces
+            start: int = low.bit_length() - 1
+            _add_targets(moves, start, table[start] & ~own, enemies)
+            pieces ^= low
+    for kind, attack_function in ((BISHOP, bishop_attacks), (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+        pieces = bitboards[base | kind]
+        while pieces:
+            low = pieces & -pieces
+            start = low.bit_length() - 1
+            _add_targets(moves, start, attack_function(start, occupied) & ~own, enemies)
+            pieces ^= low
+    _add_castling_moves(board, moves, color, occupied)
+    return moves
+
+def pinned_pieces(board: object, color: int, king: int) -> dict[int, int]:
+    '''Returns the pieces of the given color pinned to their king, mapped to the line they may still move along'''
+    pins: dict[int, int] = {}
+    bitboards: list[int] = board.bitboards
+    enemy: int = (color ^ 1) << 3
+    own: int = board.occupancy[color]
+    occupied: int = board.occupancy[BOTH]
+    queens: int = bitboards[enemy | QUEEN]
+    for rays, pinners in ((_ROOK_RAYS, bitboards[enemy | ROOK] | queens),
+                          (_BISHOP_RAYS, bitboards[enemy | BISHOP] | queens)):
+        if not pinners:
+            continue
+        for direction, positive in rays:
+            ray: int = RAY_MASKS[king][direction]
+            if not ray & pinners:
+                continue
+            blockers: int = ray & occupied
+            first: int = blockers & -blockers if positive else 1 << blockers.bit_length() - 1
+            if not first & own:
+                continue
+            blockers ^= first
+            if not blockers:
+                continue
+            second: int = blockers & -blockers if positive else 1 << blockers.bit_length() - 1
+            if second & pinners:
+                square: int = second.bit_length() - 1
+                pins[first.bit_length() - 1] = ray ^ RAY_MASKS[square][direction]
+    return pins
+
+def _ep_is_legal(board: object, start: int, color: int, king: int) -> bool:
+    '''Plays an en passant capture on the occupancy only and checks the king is not left attacked'''
+    bitboards: list[int] = board.bitboards
+    enemy: int = (color ^ 1) << 3
+    end: int = board.ep_square
+    captured: int = end + 8 if color == WHITE else end - 8
+    occupied: int = board.occupancy[BOTH] ^ SQUARE_MASKS[start] ^ SQUARE_MASKS[captured] | SQUARE_MASKS[end]
+    queens: int = bitboards[enemy | QUEEN]
+    return not (PAWN_ATTACKS[color][king] & bitboards[enemy | PAWN] & ~SQUARE_MASKS[captured]
+                or KNIGHT_ATTACKS[king] & bitboards[enemy | KNIGHT]
+                or bishop_attacks(king, occupied) & (bitboards[enemy | BISHOP] | queens)
+                or rook_attacks(king, occupied) & (bitboards[enemy | ROOK] | queens))
+
+def generate_legal_moves(board: object) -> list[int]:
+    '''Generates the legal moves for the side to move
+    Checkers and pinned pieces are found once, then every target is filtered with a check mask and pin lines'''
+    if METRICS.enabled:
+        METRICS.count(MOVE_GENERATIONS)
+    moves: list[int] = []
+    bitboards: list[int] = board.bitboards
+    occupancy: list[int] = board.occupancy
+    color: int = board.side
+    enemy: int = color ^ 1
+    base: int = color << 3
+    own: int = occupancy[color]
+    enemies: int = occupancy[enemy]
+    occupied: int = occupancy[BOTH]
+    king_mask: int = bitboards[base | KING]
+    if not king_mask:
+        return generate_moves(board)
+    king: int = king_mask.bit_length() - 1
+    # The king may not step onto a square that is only safe because the king itself blocks the ray
+    without_king: int = occupied ^ king_mask
+    targets: int = KING_ATTACKS[king] & ~own
+    while targets:
+        low: int = targets & -targets
+        target: int = low.bit_length() - 1
+        if not attackers_to(board, target, enemy, without_king):
+            moves.append(king | target << 6 | (CAPTURE << 12 if low & enemies else 0))
+        targets ^= low
+    checkers: int = attackers_to(board, king, enemy)
+    if checkers & checkers - 1:
+        return moves
+    check_mask: int = BETWEEN[king][checkers.bit_length() - 1] | checkers if checkers else FULL
+    pins: dict[int, int] = pinned_pieces(board, color, king)
+    pinned: int = 0
+    for square in pins:
+        pinned |= SQUARE_MASKS[square]
+    pawns: int = bitboards[base | PAWN]
+    empty: int = ~occupied & FULL
+    _add_pawn_set(moves, color, pawns & ~pinned, empty, enemies, check_mask)
+    for square, line in pins.items():
+        if board.squares[square] == base | PAWN:
+            _add_pawn_set(moves, color, SQUARE_MASKS[square], empty, enemies, check_mask & line)
+    if board.ep_square != -1:
+        capturers: int = PAWN_ATTACKS[enemy][board.ep_square] & pawns
+        while capturers:
+            low = capturers & -capturers
+            start: int = low.bit_length() - 1
+            if _ep_is_legal(board, start, color, king):
+                moves.append(start | board.ep_square << 6 | EP_CAPTURE << 12)
+            capturers ^= low
+    # A pinned knight can never move, so knights only need the check mask
+    pieces: int = bitboards[base | KNIGHT] & ~pinned
+    while pieces:
+        low = pieces & -pieces
+        start = low.bit_length() - 1
+        _add_targets(moves, start, KNIGHT_ATTACKS[start] & ~own & check_mask, enemies)
+        pieces ^= low
+    for kind, attack_function in ((BISHOP, bishop_attacks), (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+        pieces = bitboards[base | kind]
+        while pieces:
+            low = pieces & -pieces
+            start = low.bit_length() - 1
+            allowed: int = check_mask & pins[start] if low & pinned else check_mask
+            _add_targets(moves, start, attack_function(start, occupied) & ~own & allowed, enemies)
+            pieces ^= low
+    if not checkers:
+        _add_castling_moves(board, moves, color, occupied)
+    return moves
+
+def _is_path_attacked(board: object, square: int, color: int) -> bool:
+    '''Returns True if the given color attacks a square, from the attack map when the board tracks one'''
+    attack_map: object = board.attack_map
+    if attack_map is not None:
+        return attack_map.attacked[color] >> square & 1 == 1
+    return is_square_attacked(board, square, color)
+
+def _add_castling_moves(board: object, moves: list, color: int, occupied: int) -> None:
+    '''Appends the castling moves whose path is empty and not attacked'''
+    rights: int = board.castling >> (2 * color) & 3
+    if not rights:
+        return
+    king: int = WHITE_KING_START if color == WHITE else BLACK_KING_START
+    enemy: int = color ^ 1
+    if board.squares[king] != (color << 3 | KING) or _is_path_attacked(board, king, enemy):
+        return
+    if rights & 1 and not occupied & (SQUARE_MASKS[king + 1] | SQUARE_MASKS[king + 2]) \
+            and board.squares[king + 3] == (color << 3 | ROOK) \
+            and not _is_path_attacked(board, king + 1, enemy) and not _is_path_attacked(board, king + 2, enemy):
+        moves.append(encode_move(king, king + 2, KING_CASTLE))
+    if rights & 2 and not occupied & (SQUARE_MASKS[king - 1] | SQUARE_MASKS[king - 2] | SQUARE_MASKS[king - 3]) \
+            and board.squares[king - 4] == (color << 3 | ROOK) \
+            and not _is_path_attacked(board, king - 1, enemy) and not _is_path_attacked(board, king - 2, enemy):
+        moves.append(encode_move(king, king - 2, QUEEN_CASTLE))
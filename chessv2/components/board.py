@@ -1,47 +1,107 @@
 '''This class is used to create the board object, which handles board state, and drawing'''
 from __future__ import annotations
-import pygame
-from pygame import Surface
-from .constants import DARK, LIGHT, SQUARE_SIZE, ROWS
-from .pieces import King, Queen, Pawn, Bishop, Knight, Rook, Piece
-# TODO The current idea I have for seeing if a piece is valid, is to change the name of get valid pieces
-# and use this current function to get all of the possible moves wihout checking if the king is in check
-# then use the get valid pieces function to see if a king is in check by grabbing all of the possible moves
-# of the opposite color and seeing if the king is in any of those moves
+import logging
+from typing import Iterable, TYPE_CHECKING
+from .constants import SQUARE_SIZE
+from .pieces import take_piece, release_piece
+from .bitboard import WHITE, BLACK, BOTH, PAWN, KNIGHT, BISHOP, ROOK, KING, ALL_CASTLING, CASTLING_RIGHTS, \
+    SQUARE_MASKS, FULL, LIGHT_SQUARES, PAWN_ATTACKS, \
+    QUEEN, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, EP_CAPTURE, PROMOTION, PROMOTION_PIECES, \
+    generate_moves, generate_legal_moves, is_square_attacked, attackers_to, square_name
+from .fen import START_FEN, FenPosition, parse_fen, format_fen
+from .attacks import AttackMap, move_squares
+from .evaluation import MG_TABLE, EG_TABLE, PHASE_TABLE
+from .zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS, compute_hash
+from .metrics import METRICS, CHECKS, MOVES_MADE, timed
+if TYPE_CHECKING:
+    from pygame import Surface
+# Drawn board of every board loaded without piece views, shared since nothing is ever drawn on it
+NO_VIEWS: tuple = (0,) * 64
+# Plies without a capture or pawn move that draw the game, and how many times a position must occur to draw it
+FIFTY_MOVE_PLIES: int = 100
+REPETITION_LIMIT: int = 3
+# Reasons returned by Board.draw_reason
+THREEFOLD_REPETITION: str = 'threefold repetition'
+FIFTY_MOVE_RULE: str = 'fifty-move rule'
+INSUFFICIENT_MATERIAL: str = 'insufficient material'
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
 class Board:
     '''Board object stores board state'''
-    def __init__(self) -> None:
-        self.board: list = [0] * 64
-        self.current_fen: str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
-        self.create_board()
-        self.board_to_fen()
-        self.en_passant: int = -1
-        self.pieces: list = []
-        self.attack_moves: list = []
-        self.turn = 'white'
-        self.old_piece: object = None
+    __slots__ = ('board', 'bitboards', 'occupancy', 'squares', 'side', 'castling', 'ep_square', 'zobrist_key',
+                 'undo_stack', 'piece_counts', 'mg_score', 'eg_score', 'phase', 'full_move_counter',
+                 'half_move_counter', 'attack_map', 'history', 'repetitions')
+    board: list | tuple
+    bitboards: list[int]
+    occupancy: list[int]
+    squares: bytearray
+    side: int
+    castling: int
+    ep_square: int
+    zobrist_key: int
+    undo_stack: list[int]
+    piece_counts: list[int]
+    mg_score: int
+    eg_score: int
+    phase: int
+    full_move_counter: int
+    half_move_counter: int
+    attack_map: AttackMap | None
+    history: list[int]
+    repetitions: dict[int, int]
+    def __init__(self, views: bool = True) -> None:
+        '''views=False builds a board for searching or serving that never creates Piece objects'''
+        # Piece objects drawn on each square, 0 when empty, NO_VIEWS for boards without views
+        self.board: list | tuple = NO_VIEWS
+        # Bitboard backend kept in sync with self.board, indexed by piece code
+        self.bitboards: list[int] = [0] * 16
+        # Occupancy of white, black and both colors
+        self.occupancy: list[int] = [0, 0, 0]
+        # Piece code on each square, 0 when empty
+        self.squares: bytearray = bytearray(64)
+        self.side: int = WHITE
+        self.castling: int = ALL_CASTLING
+        # Square a pawn can capture onto en passant, -1 when there is none
+        self.ep_square: int = -1
+        # 64 bit zobrist key of the position, updated with every change to the bitboards
+        self.zobrist_key: int = 0
+        # One packed integer per made move holding what unmake_move needs to restore
+        self.undo_stack: list[int] = []
+        # Zobrist keys of every position since the board was loaded, the current one last,
+        # and how many times each key occurs in it
+        self.history: list[int] = []
+        self.repetitions: dict[int, int] = {}
+        # Number of pieces of each piece code on the board
+        self.piece_counts: list[int] = [0] * 16
+        # White relative piece square sums and game phase, read by evaluation.evaluate
+        self.mg_score: int = 0
+        self.eg_score: int = 0
+        self.phase: int = 0
         self.full_move_counter: int = 0
         self.half_move_counter: int = 0
-        self.white_pawns: int = 0
-        self.black_pawns: int = 0
-        self.white_knights: int = 0
-        self.black_knights: int = 0
-        self.white_bishops: int = 0
-        self.black_bishops: int = 0
-        self.white_rooks: int = 0
-        self.black_rooks: int = 0
-        self.white_queens: int = 0
-        self.black_queens: int = 0
-        self.black_king: object = None
-        self.white_king: object = None
+        # Attack counts kept in step by make_move and unmake_move, None until track_attacks is called
+        self.attack_map: AttackMap | None = None
+        self.create_board(views)
         
-    def draw_squares(self, win: Surface) -> None:
-        '''Draws the squares onto the board'''
-        win.fill(DARK)
-        for row in range(ROWS):
-            for col in range(row % 2, ROWS, 2):
-                pygame.draw.rect(win, LIGHT, (row * SQUARE_SIZE, col * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-        self.draw_piece(win)
+    @property
+    def turn(self) -> str:
+        '''Returns the color of the side to move'''
+        return 'white' if self.side == WHITE else 'black'
+
+    def draw_squares(self, win: Surface, squares: Iterable[int] = None) -> None:
+        '''Draws the squares onto the board from the cached background, only the given squares if any'''
+        from .sprites import get_background
+        background: Surface = get_background()
+        if squares is None:
+            win.blit(background, (0, 0))
+            self.draw_piece(win)
+            return
+        for pos in squares:
+            area: tuple = (pos % 8 * SQUARE_SIZE, pos // 8 * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+            win.blit(background, area[:2], area)
+            if self.board[pos] != 0:
+                self.board[pos].draw(win)
 
     def get_piece(self, pos: int) -> object:
         '''Returns the piece at the given position'''
@@ -53,182 +113,335 @@ class Board:
             if piece != 0:
                 piece.draw(win)
     
-    def create_board(self) -> None:
+    def create_board(self, views: bool = True) -> None:
         '''This method creates the board'''
-        self.fen_to_board(self.current_fen)
+        self.fen_to_board(START_FEN, views)
      
-    def fen_to_board(self, fen: str) -> None:
-        '''This method takes a fen string and converts it to a 0-63 array board'''
-        space_counter: int = 0
-        x_pos: int = 0
-        y_pos: int = 0
- 
-        for char in fen:
-            if space_counter > 0:
-                return
-            if char == ' ':
-                space_counter += 1
-            elif char == '/':
-                y_pos += 100
-                x_pos = 0
-            elif char.isdigit():
-                x_pos += (int(char) * 100)
-            else:
-                board_position:int = int((y_pos/100 * 8) + x_pos/100)
-                if char == 'r':
-                    self.board[board_position] = Rook(board_position, 'black')
-                elif char == 'n':
-                    self.board[board_position] = Knight(board_position, 'black')
-                elif char == 'b':
-                    self.board[board_position] = Bishop(board_position, 'black')
-                elif char == 'q':
-                    self.board[board_position] = Queen(board_position, 'black')
-                elif char == 'k':
-                    self.board[board_position] = King(board_position, 'black')
-                    self.black_king = self.board[board_position]
-                    print("Black King: ", self.black_king)
-                elif char == 'p':
-                    self.board[board_position] = Pawn(board_position, 'black')
-                elif char == 'R':
-                    self.board[board_position] = Rook(board_position, 'white')
-                elif char == 'N':
-                    self.board[board_position] = Knight(board_position, 'white')
-                elif char == 'B':
-                    self.board[board_position] = Bishop(board_position, 'white')
-                elif char == 'Q':
-                    self.board[board_position] = Queen(board_position, 'white')
-                elif char =='K':
-                    self.board[board_position] = King(board_position, 'white')
-                    self.white_king = self.board[board_position]
-                    print("White King: ", self.white_king)
-                elif char == 'P':
-                    self.board[board_position] = Pawn(board_position, 'white')
-                x_pos += 100
-                
+    def fen_to_board(self, fen: str, views: bool = True) -> None:
+        '''This method loads every field of a fen string, raising ValueError if it is malformed
+        views=False skips creating the Piece objects, for boards that are searched but never drawn'''
+        self.load_position(parse_fen(fen), views)
+
+    def load_position(self, position: FenPosition, views: bool = True) -> None:
+        '''This method loads a position parsed by fen.parse_fen into the bitboards and the drawn board'''
+        self.side = position.side
+        self.castling = position.castling
+        self.ep_square = position.ep_square
+        self.half_move_counter = position.half_move_counter
+        self.full_move_counter = position.full_move_counter
+        # the key of the empty board holds the side, castling and en passant, put_code adds the pieces
+        self.clear_bitboards()
+        self.release_views()
+        if views:
+            self.board = [0] * 64
+        for pos, code in enumerate(position.squares):
+            if code:
+                self.put_code(code, pos)
+                if views:
+                    self.board[pos] = take_piece(code, pos)
+        # a square no pawn can capture on is dropped, so the key matches the same position reached by moves
+        if self.ep_square != -1 and not PAWN_ATTACKS[self.side ^ 1][self.ep_square] \
+                & self.bitboards[self.side << 3 | PAWN]:
+            self.zobrist_key ^= EP_KEYS[self.ep_square & 7]
+            self.ep_square = -1
+        self.history = [self.zobrist_key]
+        self.repetitions = {self.zobrist_key: 1}
+        if views or self.attack_map is not None:
+            self.track_attacks()
+
+    def track_attacks(self) -> None:
+        '''This method builds the attack map, which every later move then updates incrementally
+        Drawn boards track attacks from the start, searched boards never do'''
+        self.attack_map = AttackMap(self)
+
+    def release_views(self) -> None:
+        '''This method hands the Piece objects back to the pool, leaving the board without views'''
+        if self.board is not NO_VIEWS:
+            for piece in self.board:
+                if piece != 0:
+                    release_piece(piece)
+            self.board = NO_VIEWS
+
     def board_to_fen(self) -> str:
-        '''This method takes a 0-63 array board and converts it to a fen string'''
-        fen : str = ""
-        space_counter: int = 0
-        for i, piece in enumerate(self.board):
-            if piece != 0:
-                if space_counter > 0:
-                    fen += str(space_counter)
-                space_counter = 0
-                fen += piece.piece_to_fen()
-            elif piece == 0:
-                space_counter += 1
-            if i % 8 == 7 and i != 0 and i != 63:
-                if space_counter > 0:
-                    fen += str(space_counter)
-                fen += '/'
-                space_counter = 0
-            elif i % 8 == 7 and i == 63:
-                fen += ' '
-        fen += 'w KQkq - 0 1'
-        return fen
-                
+        '''This method writes the fen string of the position'''
+        return format_fen(self)
+
     def get_valid_moves(self, piece: object) -> list:
-        '''This method takes a piece object and returns a list of valid moves'''
+        '''This method takes a piece object and returns the squares it can legally move to'''
         valid_moves: list = []
         if piece != 0:
-            valid_moves = piece.get_valid_moves(self)
-            print("Valid Moves: ", valid_moves)
+            valid_moves = list(dict.fromkeys(move >> 6 & 63 for move in self.legal_moves()
+                                             if move & 63 == piece.board_pos))
+            piece.valid_moves = valid_moves
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug('valid moves from %s: %s', square_name(piece.board_pos), valid_moves)
         return valid_moves
 
-    def get_all_pieces(self, board: list) -> list:
-        '''This method gets all the pieces on the board and places them in a list'''
-        all_pieces: list = []
-        for piece in board:
-            if piece != 0:
-                all_pieces.append(piece)
-        return all_pieces
-
-    def move(self, piece: object, destination: int) -> None:
-        '''This method moves pieces on the board'''
-        self.attack_moves = []
-        self.en_passant = -1
-        self.board[piece.board_pos] = 0
-        self.board[destination] = piece
+    @timed()
+    def move(self, piece: object, destination: int, promotion: int = QUEEN) -> int:
+        '''This method moves pieces on the board by playing the matching legal move and returns it encoded
+        Pawns reaching the last rank become the promotion piece, a queen by default'''
         previous: int = piece.board_pos
-        pawn_direction: int = -1 if piece.color == 'white' else 1
+        move: int = self.find_move(previous, destination, promotion)
+        flag: int = move >> 12
+        self.make_move(move)
+        if self.board[destination] != 0:
+            release_piece(self.board[destination])
+        self.board[previous] = 0
+        self.board[destination] = piece
         piece.move(destination)
-        # Here I need to check to see if the piece is a pawn for en passant or promotion
-        # I also need to check to see if it is a king or rook for castling
-        if isinstance(piece, Pawn):
-            if piece.y_pos in [0, 700]:
-                self.promote(piece)
-            if abs(previous - destination) == 16:
-                self.en_passant = piece.board_pos
-            if previous % 8 != destination % 8 and self.old_piece == 0:
-                self.board[destination + (-pawn_direction * 8)] = 0
-                print("in the en passant capture method")
-                print("En Passant: ", destination + (-pawn_direction * 8))
-                
-        if isinstance(piece, King):
-            piece.king_side = False
-            piece.queen_side = False
-            
-        if isinstance(piece, Rook):
-            piece.moved = True
-        self.pieces = self.get_all_pieces(self.board)
-        for piece_on_board in self.pieces:
-            piece_on_board.clear_moves()
-        self.full_move_counter += 1
-        self.get_all_attacks()
-        if self.turn == 'white':
-            self.turn = 'black'
-        else:
-            self.turn = 'white'
-        self.old_piece = 0
-    def capture(self, piece: object, destination: int) -> None:
-        '''This method handles capturing pieces'''
+        if flag == EP_CAPTURE:
+            captured: int = destination + (8 if piece.color == 'white' else -8)
+            release_piece(self.board[captured])
+            self.board[captured] = 0
+        elif flag & PROMOTION:
+            self.promote(piece, promotion)
+        elif flag in (KING_CASTLE, QUEEN_CASTLE):
+            self.castle(piece, destination)
+        for piece_on_board in self.board:
+            if piece_on_board != 0:
+                piece_on_board.clear_moves()
+        return move
+
+    def capture(self, piece: object, destination: int, promotion: int = QUEEN) -> int:
+        '''This method handles capturing pieces, returning the encoded move or 0 for a piece of the same color'''
         piece_to_capture: object = self.board[destination]
         if piece_to_capture.color != piece.color:
-            self.old_piece = piece_to_capture
-            self.board[destination] = 0
-            del piece_to_capture
-            self.move(piece, destination)
+            return self.move(piece, destination, promotion)
+        return 0
     
-    def promote(self, piece: object) -> None:
-        '''This method handles pawn promotion'''
-        self.board[piece.board_pos] = Queen(piece.board_pos, piece.color)
+    def promote(self, piece: object, promotion: int = QUEEN) -> None:
+        '''This method swaps a promoted pawn for a pooled promotion piece on the drawn board'''
+        self.board[piece.board_pos] = take_piece(piece.code & 8 | promotion, piece.board_pos)
+        release_piece(piece)
     
     def castle(self, piece: object, destination: int) -> None:
-        '''This method handles castling'''
-        
+        '''This method moves the rook on the drawn board once the king has castled'''
+        king_side: bool = destination % 8 == 6
+        rook_start: int = destination + 1 if king_side else destination - 2
+        rook_end: int = destination - 1 if king_side else destination + 1
+        rook: object = self.board[rook_start]
+        self.board[rook_start] = 0
+        self.board[rook_end] = rook
+        rook.move(rook_end)
+
+    def play(self, move: int) -> int:
+        '''This method plays an encoded legal move through move, keeping the drawn pieces in sync'''
+        piece: object = self.board[move & 63]
+        promotion: int = PROMOTION_PIECES[move >> 12 & 3] if move >> 12 & PROMOTION else QUEEN
+        return self.move(piece, move >> 6 & 63, promotion)
+
+    def find_move(self, start: int, end: int, promotion: int = QUEEN) -> int:
+        '''This method returns the legal encoded move from start to end, raising ValueError if there is none'''
+        for move in self.legal_moves():
+            if move & 63 == start and move >> 6 & 63 == end \
+                    and (not move >> 12 & PROMOTION or PROMOTION_PIECES[move >> 12 & 3] == promotion):
+                return move
+        raise ValueError(f'{square_name(start)}{square_name(end)} is not a legal move')
+
     def generate_all_moves(self) -> dict:
-        '''This method generates all the moves for all the pieces on the board'''
+        '''This method groups the legal moves of the side to move by the square they start from'''
         legal_moves: dict = {}
-        for piece in self.pieces:
-            legal_moves[piece.board_pos] = self.get_valid_moves(piece)
-        print("Legal Moves: ", legal_moves)
+        for move in self.legal_moves():
+            legal_moves.setdefault(move & 63, []).append(move >> 6 & 63)
+        _logger.debug('legal moves: %s', legal_moves)
         return legal_moves
 
-    def get_all_attacks(self) -> None:
-        '''This method gets all the squares that are being attacked
-        Should be called after every move before the next player's turn'''
-        attack_moves: list[int] = []
-        for piece in self.pieces:
-            if piece.color == self.turn:
-                piece.get_valid_moves(self)
-                attack_moves.extend(piece.attack_moves)
-        self.attack_moves = attack_moves
-
     def is_check(self, board: list, color: str) -> bool:
         '''This method checks to see if the king is in check
         Should be called at the beginning of every turn'''
-        all_pieces: list[Piece] = self.get_all_pieces(board)
-        king: object = self.get_king(board, color)
-        print("King: ", king)
-        for piece in all_pieces:
-            if piece.color != king.color:
-                if king.board_pos in self.get_valid_moves(piece):
-                    return True
-        return False
-
-    def get_king(self, board: list, color: str) -> object:
-        '''This method gets the king object'''
-        for piece in board:
-            if isinstance(piece, King) and piece.color == color:
-                return piece
-        return None
\ No newline at end of file
+        side: int = WHITE if color == 'white' else BLACK
+        king: int = self.bitboards[side << 3 | KING]
+        if METRICS.enabled:
+            METRICS.count(CHECKS)
+        if self.attack_map is not None:
+            return self.attack_map.in_check(self, side)
+        return bool(king) and is_square_attacked(self, king.bit_length() - 1, side ^ 1)
+
+    def clear_bitboards(self) -> None:
+        '''This method empties the bitboard backend, leaving only the side, castling and en passant keys'''
+        self.bitboards = [0] * 16
+        self.occupancy = [0, 0, 0]
+        self.squares = bytearray(64)
+        self.undo_stack = []
+        self.piece_counts = [0] * 16
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
+        self.zobrist_key = compute_hash(self)
+
+    def put_code(self, code: int, pos: int) -> None:
+        '''This method places a piece code on an empty square of the bitboards'''
+        mask: int = SQUARE_MASKS[pos]
+        self.bitboards[code] |= mask
+        self.occupancy[code >> 3] |= mask
+        self.occupancy[BOTH] |= mask
+        self.squares[pos] = code
+        self.zobrist_key ^= PIECE_KEYS[code][pos]
+        self.piece_counts[code] += 1
+        self.mg_score += MG_TABLE[code][pos]
+        self.eg_score += EG_TABLE[code][pos]
+        self.phase += PHASE_TABLE[code]
+
+    def remove_code(self, pos: int) -> None:
+        '''This method removes the piece code on a square of the bitboards'''
+        code: int = self.squares[pos]
+        mask: int = SQUARE_MASKS[pos]
+        self.bitboards[code] ^= mask
+        self.occupancy[code >> 3] ^= mask
+        self.occupancy[BOTH] ^= mask
+        self.squares[pos] = 0
+        self.zobrist_key ^= PIECE_KEYS[code][pos]
+        self.piece_counts[code] -= 1
+        self.mg_score -= MG_TABLE[code][pos]
+        self.eg_score -= EG_TABLE[code][pos]
+        self.phase -= PHASE_TABLE[code]
+
+    def move_code(self, start: int, end: int) -> None:
+        '''This method moves a piece code to an empty square of the bitboards'''
+        code: int = self.squares[start]
+        mask: int = SQUARE_MASKS[start] | SQUARE_MASKS[end]
+        self.bitboards[code] ^= mask
+        self.occupancy[code >> 3] ^= mask
+        self.occupancy[BOTH] ^= mask
+        self.squares[start] = 0
+        self.squares[end] = code
+        self.zobrist_key ^= PIECE_KEYS[code][start] ^ PIECE_KEYS[code][end]
+        self.mg_score += MG_TABLE[code][end] - MG_TABLE[code][start]
+        self.eg_score += EG_TABLE[code][end] - EG_TABLE[code][start]
+
+    def make_move(self, move: int) -> None:
+        '''This method plays an encoded move on the bitboards and pushes an undo record
+        The Piece objects in self.board are left untouched, they are only a view for drawing'''
+        if METRICS.enabled:
+            METRICS.count(MOVES_MADE)
+        start: int = move & 63
+        end: int = move >> 6 & 63
+        flag: int = move >> 12
+        squares: bytearray = self.squares
+        code: int = squares[start]
+        captured: int = squares[end]
+        # captured piece, en passant square, castling rights, zobrist key and half move clock
+        self.undo_stack.append(((self.half_move_counter << 64 | self.zobrist_key) << 15 | self.castling << 11
+                                | (self.ep_square + 1) << 4 | captured))
+        if self.ep_square != -1:
+            self.zobrist_key ^= EP_KEYS[self.ep_square & 7]
+            self.ep_square = -1
+        if captured:
+            self.remove_code(end)
+        self.move_code(start, end)
+        if flag:
+            if flag & PROMOTION:
+                self.remove_code(end)
+                self.put_code((code & 8) | PROMOTION_PIECES[flag & 3], end)
+            elif flag == DOUBLE_PUSH:
+                # only kept when an enemy pawn can capture, otherwise repeated positions would hash apart
+                ep_square: int = (start + end) >> 1
+                if PAWN_ATTACKS[self.side][ep_square] & self.bitboards[(self.side ^ 1) << 3 | PAWN]:
+                    self.ep_square = ep_square
+                    self.zobrist_key ^= EP_KEYS[end & 7]
+            elif flag == EP_CAPTURE:
+                self.remove_code(end + 8 if self.side == WHITE else end - 8)
+            elif flag == KING_CASTLE:
+                self.move_code(end + 1, end - 1)
+            elif flag == QUEEN_CASTLE:
+                self.move_code(end - 2, end + 1)
+        rights: int = self.castling & CASTLING_RIGHTS[start] & CASTLING_RIGHTS[end]
+        if rights != self.castling:
+            self.zobrist_key ^= CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[rights]
+            self.castling = rights
+        if code & 7 == PAWN or captured:
+            self.half_move_counter = 0
+        else:
+            self.half_move_counter += 1
+        if self.side == BLACK:
+            self.full_move_counter += 1
+        self.side ^= 1
+        self.zobrist_key ^= SIDE_KEY
+        key: int = self.zobrist_key
+        self.history.append(key)
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+        if self.attack_map is not None:
+            self.attack_map.update(self, move_squares(move, self.side ^ 1))
+
+    def unmake_move(self, move: int) -> None:
+        '''This method takes back the last move played with make_move'''
+        start: int = move & 63
+        end: int = move >> 6 & 63
+        flag: int = move >> 12
+        record: int = self.undo_stack.pop()
+        key: int = self.history.pop()
+        if self.repetitions[key] == 1:
+            del self.repetitions[key]
+        else:
+            self.repetitions[key] -= 1
+        self.side ^= 1
+        if self.side == BLACK:
+            self.full_move_counter -= 1
+        if flag:
+            if flag & PROMOTION:
+                self.remove_code(end)
+                self.put_code(self.side << 3 | PAWN, end)
+            elif flag == EP_CAPTURE:
+                self.put_code((self.side ^ 1) << 3 | PAWN, end + 8 if self.side == WHITE else end - 8)
+            elif flag == KING_CASTLE:
+                self.move_code(end - 1, end + 1)
+            elif flag == QUEEN_CASTLE:
+                self.move_code(end + 1, end - 2)
+        self.move_code(end, start)
+        if record & 15:
+            self.put_code(record & 15, end)
+        self.ep_square = (record >> 4 & 127) - 1
+        self.castling = record >> 11 & 15
+        self.zobrist_key = record >> 15 & FULL
+        self.half_move_counter = record >> 79
+        if self.attack_map is not None:
+            self.attack_map.update(self, move_squares(move, self.side))
+
+    def repetition_count(self) -> int:
+        '''This method returns how many times the current position has occurred since the board was loaded'''
+        return self.repetitions[self.zobrist_key]
+
+    def is_insufficient_material(self) -> bool:
+        '''This method checks if neither side has the material to mate: bare kings, a single minor piece,
+        or only bishops that all stand on squares of one color'''
+        bitboards: list[int] = self.bitboards
+        for kind in (PAWN, ROOK, QUEEN):
+            if bitboards[kind] | bitboards[BLACK << 3 | kind]:
+                return False
+        knights: int = bitboards[KNIGHT] | bitboards[BLACK << 3 | KNIGHT]
+        bishops: int = bitboards[BISHOP] | bitboards[BLACK << 3 | BISHOP]
+        if knights:
+            return not bishops and knights.bit_count() == 1
+        return not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES
+
+    def draw_reason(self) -> str:
+        '''This method returns why the position is drawn by rule, or an empty string when it is not
+        Checkmate on the last ply of the fifty moves still wins, so callers check for mate first'''
+        if self.repetitions[self.zobrist_key] >= REPETITION_LIMIT:
+            return THREEFOLD_REPETITION
+        if self.half_move_counter >= FIFTY_MOVE_PLIES:
+            return FIFTY_MOVE_RULE
+        if self.is_insufficient_material():
+            return INSUFFICIENT_MATERIAL
+        return ''
+
+    def generate_moves(self) -> list[int]:
+        '''This method generates the pseudo legal moves of the side to move from the bitboards'''
+        return generate_moves(self)
+
+    def legal_moves(self) -> list[int]:
+        '''This method generates the legal moves of the side to move from the bitboards'''
+        return generate_legal_moves(self)
+
+    def is_attacked(self, pos: int, color: str) -> bool:
+        '''This method checks if the given color attacks a square using the attack map or the bitboards'''
+        side: int = WHITE if color == 'white' else BLACK
+        if self.attack_map is not None:
+            return self.attack_map.is_attacked(side, pos)
+        return is_square_attacked(self, pos, side)
+
+    def get_attackers(self, pos: int, color: str) -> list[int]:
+        '''This method returns the squares of the pieces of the given color attacking a square'''
+        attackers: int = attackers_to(self, pos, WHITE if color == 'white' else BLACK)
+        return [square for square in range(64) if attackers >> square & 1]
@@ -0,0 +1,138 @@
+'''This module builds and reads the opening book, a file of fixed size records sorted by zobrist key
+The file is memory mapped read only and searched in place, so any number of processes share one copy in the
+page cache. Build a book from PGN files from the repository root with: python -m chessv2.components.book --help'''
+from __future__ import annotations
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from typing import Final, Iterable
+from .board import Board
+from .bitboard import generate_legal_moves, move_to_uci
+from .perft import START_FEN
+from .pgn import read_games, san_to_move
+
+# Key, move and weight, big endian so the records sort by key byte for byte
+RECORD_FORMAT: Final[str] = '>QHH'
+_RECORD_STRUCT: Final[struct.Struct] = struct.Struct(RECORD_FORMAT)
+_KEY_STRUCT: Final[struct.Struct] = struct.Struct('>Q')
+RECORD_BYTES: Final[int] = _RECORD_STRUCT.size
+# Plies of each game added to the book by default
+BOOK_PLIES: Final[int] = 20
+MAX_WEIGHT: Final[int] = 0xFFFF
+# Weight a move earns for the side that played it, by the game's result
+_RESULT_POINTS: Final[dict] = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+
+class OpeningBook:
+    '''Read only view of a book file, probed by binary search over the mapped records'''
+    __slots__ = ('path', 'file', 'data', 'size')
+    path: str
+    file: object
+    data: mmap.mmap
+    size: int
+    def __init__(self, path: str) -> None:
+        '''Maps the book file, an empty file is a book with no moves'''
+        self.path: str = path
+        self.file: object = open(path, 'rb')
+        length: int = os.fstat(self.file.fileno()).st_size
+        self.size: int = length // RECORD_BYTES
+        self.data: mmap.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if length else None
+
+    def __len__(self) -> int:
+        '''Returns the number of records'''
+        return self.size
+
+    def close(self) -> None:
+        '''Unmaps and closes the file'''
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+
+    def probe(self, key: int) -> list[tuple[int, int]]:
+        '''Returns the (move, weight) pairs stored for a zobrist key, highest weight first'''
+        data: mmap.mmap = self.data
+        low: int = 0
+        high: int = self.size
+        while low < high:
+            middle: int = (low + high) >> 1
+            if _KEY_STRUCT.unpack_from(data, middle * RECORD_BYTES)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries: list[tuple[int, int]] = []
+        while low < self.size:
+            record_key, move, weight = _RECORD_STRUCT.unpack_from(data, low * RECORD_BYTES)
+            if record_key != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        entries.sort(key=lambda entry: entry[1], reverse=True)
+        return entries
+
+    def choose(self, board: Board, rng: random.Random = None) -> int:
+        '''Picks a book move for the board's position at random by weight, or returns 0 when it is out of book
+        Moves that are not legal, which only a key collision can produce, are skipped'''
+        if not self.size:
+            return 0
+        legal: set[int] = set(generate_legal_moves(board))
+        entries: list[tuple[int, int]] = [entry for entry in self.probe(board.zobrist_key)
+                                          if entry[0] in legal and entry[1]]
+        if not entries:
+            return 0
+        return (rng or random).choices([move for move, _ in entries], [weight for _, weight in entries])[0]
+
+def build_book(paths: Iterable[str], output: str, plies: int = BOOK_PLIES, min_weight: int = 1) -> int:
+    '''Replays the first plies of every game in the PGN files and writes the moves played as a book
+    Each move earns 2 points for a win and 1 for a draw of the side that played it, moves below min_weight
+    are left out. Returns the number of records written'''
+    weights: dict[tuple[int, int], int] = {}
+    board: Board = Board(views=False)
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as lines:
+            for game in read_games(lines):
+                if 'FEN' in game.headers or game.result not in _RESULT_POINTS:
+                    continue
+                points: tuple[int, int] = _RESULT_POINTS[game.result]
+                board.fen_to_board(START_FEN, views=False)
+                for san in game.moves[:plies]:
+                    try:
+                        move: int = san_to_move(board, san)
+                    except ValueError:
+                        break
+                    entry: tuple[int, int] = (board.zobrist_key, move)
+                    weights[entry] = weights.get(entry, 0) + points[board.side]
+                    board.make_move(move)
+    records: list[tuple[int, int, int]] = sorted((key, move, min(weight, MAX_WEIGHT))
+                                                 for (key, move), weight in weights.items() if weight >= min_weight)
+    with open(output, 'wb') as book:
+        book.write(b''.join(_RECORD_STRUCT.pack(*record) for record in records))
+    return len(records)
+
+def main(argv: list[str] = None) -> int:
+    '''Parses the command line and builds a book or lists the book moves of a position'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Opening book builder and viewer')
+    commands: argparse._SubParsersAction = parser.add_subparsers(dest='command', required=True)
+    build: argparse.ArgumentParser = commands.add_parser('build', help='build a book from PGN files')
+    build.add_argument('inputs', nargs='+', help='PGN files to read')
+    build.add_argument('-o', '--output', required=True, help='book file to write')
+    build.add_argument('--plies', type=int, default=BOOK_PLIES, help='plies of each game to add')
+    build.add_argument('--min-weight', type=int, default=1, help='leave out moves with less weight')
+    probe: argparse.ArgumentParser = commands.add_parser('probe', help="list a position's book moves")
+    probe.add_argument('book', help='book file to read')
+    probe.add_argument('--fen', default=START_FEN, help='position to look up, defaults to the start position')
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.command == 'build':
+        print(f'{build_book(args.inputs, args.output, args.plies, args.min_weight)} records written')
+        return 0
+    board: Board = Board(views=False)
+    board.fen_to_board(args.fen, views=False)
+    book: OpeningBook = OpeningBook(args.book)
+    for move, weight in book.probe(board.zobrist_key):
+        print(f'{move_to_uci(move)} {weight}')
+    book.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
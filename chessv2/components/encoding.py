@@ -0,0 +1,103 @@
+'''This module packs positions and move lists into compact binary records for position databases
+A position is 38 bytes: the 64 piece codes as 4 bit nibbles, then the side and castling, the en passant square
+and the two clocks. Moves are already 16 bit integers and are stored as little endian unsigned shorts'''
+from __future__ import annotations
+import struct
+import sys
+from array import array
+from typing import Final, Iterable
+from .fen import FenPosition
+
+__all__ = ("POSITION_FORMAT", "POSITION_BYTES", "encode_position", "decode_position", "encode_positions",
+"decode_positions", "encode_moves", "decode_moves", "encode_game", "decode_game")
+
+# Nibble packed squares, castling mask with the side in bit 4, en passant square plus one, half and full move clocks
+POSITION_FORMAT: Final[str] = '<32sBBHH'
+_POSITION_STRUCT: Final[struct.Struct] = struct.Struct(POSITION_FORMAT)
+POSITION_BYTES: Final[int] = _POSITION_STRUCT.size
+# Number of moves that follow the start position of a game record
+_COUNT_STRUCT: Final[struct.Struct] = struct.Struct('<H')
+
+def _repeat(pattern: int, width: int, total: int) -> int:
+    '''Repeats a width bit pattern to fill total bits'''
+    mask: int = 0
+    for shift in range(0, total, width):
+        mask |= pattern << shift
+    return mask
+
+# Packing merges neighbouring values in groups of twice their spacing, from 16 bit groups up to the whole
+# 512 bit board, keeping the low half of each group. Unpacking splits the groups again in the reverse order
+_PACK_STEPS: Final[tuple] = tuple((width // 4, _repeat((1 << width // 2) - 1, width, 512))
+                                  for width in (16, 32, 64, 128, 256, 512))
+_UNPACK_STEPS: Final[tuple] = tuple((width // 4, _repeat((1 << width // 4) - 1, width // 2, 512))
+                                    for width in (512, 256, 128, 64, 32, 16))
+
+def _pack_squares(squares: bytes) -> bytes:
+    '''Packs 64 piece codes of one byte each into 32 bytes of two nibbles, a8 in the high nibble of the first byte
+    The whole board is one integer, so each step merges every pair of neighbours at once'''
+    packed: int = int.from_bytes(squares, 'big')
+    for shift, mask in _PACK_STEPS:
+        packed = (packed | packed >> shift) & mask
+    return packed.to_bytes(32, 'big')
+
+def _unpack_squares(packed: bytes) -> bytes:
+    '''Spreads 32 bytes of two nibbles back to 64 piece codes of one byte each'''
+    squares: int = int.from_bytes(packed, 'big')
+    for shift, mask in _UNPACK_STEPS:
+        squares = (squares | squares << shift) & mask
+    return squares.to_bytes(64, 'big')
+
+def encode_position(position: object) -> bytes:
+    '''Packs a Board or FenPosition into POSITION_BYTES bytes'''
+    return _POSITION_STRUCT.pack(_pack_squares(position.squares), position.castling | position.side << 4,
+                                 position.ep_square + 1, position.half_move_counter, position.full_move_counter)
+
+def _position(fields: tuple) -> FenPosition:
+    '''Builds a FenPosition from the fields of one unpacked record'''
+    packed, flags, ep_square, half_move, full_move = fields
+    return FenPosition(_unpack_squares(packed), flags >> 4, flags & 15, ep_square - 1, half_move, full_move)
+
+def decode_position(data: bytes | memoryview) -> FenPosition:
+    '''Unpacks one record, load it into a Board with Board.load_position'''
+    return _position(_POSITION_STRUCT.unpack(data))
+
+def encode_positions(positions: Iterable[object]) -> bytes:
+    '''Packs many Boards or FenPositions into one buffer of back to back records'''
+    pack: object = _POSITION_STRUCT.pack
+    return b''.join([pack(_pack_squares(position.squares), position.castling | position.side << 4,
+                          position.ep_square + 1, position.half_move_counter, position.full_move_counter)
+                     for position in positions])
+
+def decode_positions(data: bytes | memoryview) -> list[FenPosition]:
+    '''Unpacks every record of a buffer, which may be a memoryview of a larger file, without copying it first'''
+    return [_position(fields) for fields in _POSITION_STRUCT.iter_unpack(data)]
+
+def encode_moves(moves: Iterable[int]) -> bytes:
+    '''Packs encoded moves as little endian 16 bit integers'''
+    packed: array = array('H', moves)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+def decode_moves(data: bytes | memoryview) -> list[int]:
+    '''Unpacks moves written by encode_moves'''
+    moves: array = array('H')
+    moves.frombytes(data)
+    if sys.byteorder == 'big':
+        moves.byteswap()
+    return moves.tolist()
+
+def encode_game(start: object, moves: Iterable[int]) -> bytes:
+    '''Packs a game as its start position, a move count and its moves, as kept by Game.start_fen and Game.moves'''
+    packed: bytes = encode_moves(moves)
+    return encode_position(start) + _COUNT_STRUCT.pack(len(packed) // 2) + packed
+
+def decode_game(data: bytes | memoryview, offset: int = 0) -> tuple[FenPosition, list[int], int]:
+    '''Unpacks the game record starting at offset and returns its start position, its moves and the offset of
+    the next record, so a buffer of back to back games can be walked without copying it'''
+    view: memoryview = memoryview(data)
+    start: FenPosition = decode_position(view[offset:offset + POSITION_BYTES])
+    offset += POSITION_BYTES
+    count: int = _COUNT_STRUCT.unpack_from(view, offset)[0]
+    offset += _COUNT_STRUCT.size
+    return start, decode_moves(view[offset:offset + 2 * count]), offset + 2 * count
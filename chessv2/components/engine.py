@@ -0,0 +1,99 @@
+'''This module runs the search in its own process so the window keeps drawing while the engine thinks
+Reports come back on a listener thread and are handed to a callback, which the game turns into pygame events'''
+from __future__ import annotations
+import multiprocessing
+import threading
+from typing import Callable, NamedTuple
+from .board import Board
+from .parallel import ParallelSearch
+from .search import Search, SearchResult, MAX_PLY
+from .transposition import TranspositionTable
+
+class EngineReport(NamedTuple):
+    '''A progress report after each completed depth, or the final answer when done is True'''
+    request_id: int
+    done: bool
+    result: SearchResult
+
+def _engine_main(requests: multiprocessing.Queue, reports: multiprocessing.Queue, cancelled: object,
+                 table_megabytes: float, workers: int) -> None:
+    '''Loop of the engine process: load each requested position, search it and report back
+    With more than one worker the root moves are split between a pool of processes'''
+    board: Board = Board(views=False)
+    table: TranspositionTable = TranspositionTable(table_megabytes)
+    parallel: ParallelSearch = ParallelSearch(board, workers, table_megabytes / workers) if workers > 1 else None
+    while True:
+        request: tuple = requests.get()
+        if request is None:
+            if parallel is not None:
+                parallel.close()
+            return
+        request_id, fen, time_limit, max_depth = request
+        if cancelled.value >= request_id:
+            continue
+        board.fen_to_board(fen, views=False)
+        engine: object = parallel if parallel is not None else Search(board, table)
+        result: SearchResult = engine.search(
+            max_depth, time_limit,
+            callback=lambda progress: reports.put(EngineReport(request_id, False, progress)),
+            stop_check=lambda: cancelled.value >= request_id)
+        reports.put(EngineReport(request_id, True, result))
+
+class EngineWorker:
+    '''Owns one engine process and the thread that relays its reports
+    Requests are numbered, cancelling marks every request so far as stale so late reports are dropped'''
+    __slots__ = ('on_report', 'requests', 'reports', 'cancelled', 'last_request', 'process', 'listener')
+    on_report: Callable[[EngineReport], None]
+    requests: multiprocessing.Queue
+    reports: multiprocessing.Queue
+    cancelled: object
+    last_request: int
+    process: multiprocessing.Process
+    listener: threading.Thread
+    def __init__(self, on_report: Callable[[EngineReport], None], table_megabytes: float = 64,
+                 workers: int = 1) -> None:
+        '''Starts the engine process, on_report is called from the listener thread
+        workers is the number of processes searching in parallel, 1 searches in the engine process itself'''
+        context = multiprocessing.get_context('spawn')
+        self.on_report: Callable[[EngineReport], None] = on_report
+        self.requests: multiprocessing.Queue = context.Queue()
+        self.reports: multiprocessing.Queue = context.Queue()
+        # Highest request id that should no longer be searched or reported
+        self.cancelled: object = context.Value('q', 0)
+        self.last_request: int = 0
+        # daemonic processes may not start children, so a parallel engine relies on close to end it
+        self.process: multiprocessing.Process = context.Process(
+            target=_engine_main, args=(self.requests, self.reports, self.cancelled, table_megabytes, workers),
+            daemon=workers == 1)
+        self.process.start()
+        self.listener: threading.Thread = threading.Thread(target=self._relay, daemon=True)
+        self.listener.start()
+
+    def start(self, fen: str, time_limit: float = None, max_depth: int = MAX_PLY) -> int:
+        '''Queues a search of the position and returns its request id'''
+        self.last_request += 1
+        self.requests.put((self.last_request, fen, time_limit, max_depth))
+        return self.last_request
+
+    def cancel(self) -> None:
+        '''Stops the running search and drops every report still on its way'''
+        self.cancelled.value = self.last_request
+
+    def close(self) -> None:
+        '''Stops the engine process and the listener thread'''
+        self.cancel()
+        self.requests.put(None)
+        self.reports.put(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.listener.join(timeout=2)
+
+    def _relay(self) -> None:
+        '''Passes reports of requests that were not cancelled to the callback'''
+        while True:
+            report: EngineReport = self.reports.get()
+            if report is None:
+                return
+            if report.request_id > self.cancelled.value:
+                self.on_report(report)
@@ -0,0 +1,124 @@
+'''This module scores positions for the search
+Board keeps the middlegame and endgame sums of the tables below up to date as pieces are placed and removed,
+so evaluate only blends two numbers instead of scanning the board'''
+from __future__ import annotations
+from typing import Final
+from .bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+# Centipawn value of each piece type in the middlegame and the endgame, indexed by piece type
+MG_VALUES: Final[tuple] = (0, 82, 337, 365, 477, 1025, 0)
+EG_VALUES: Final[tuple] = (0, 94, 281, 297, 512, 936, 0)
+# Weight of each piece type towards the middlegame, a full board adds up to MAX_PHASE
+PHASE_WEIGHTS: Final[tuple] = (0, 0, 1, 1, 2, 4, 0)
+MAX_PHASE: Final[int] = 24
+
+# Piece square tables from white's point of view, laid out like Board.board with a8 first
+_PAWN: Final[tuple] = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0)
+_PAWN_ENDGAME: Final[tuple] = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      0,   0,   0,   0,   0,   0,   0,   0)
+_KNIGHT: Final[tuple] = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+_BISHOP: Final[tuple] = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+_ROOK: Final[tuple] = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0)
+_QUEEN: Final[tuple] = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20)
+_KING: Final[tuple] = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20)
+_KING_ENDGAME: Final[tuple] = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+_MG_TABLES: Final[dict] = {PAWN: _PAWN, KNIGHT: _KNIGHT, BISHOP: _BISHOP, ROOK: _ROOK, QUEEN: _QUEEN, KING: _KING}
+_EG_TABLES: Final[dict] = {PAWN: _PAWN_ENDGAME, KNIGHT: _KNIGHT, BISHOP: _BISHOP, ROOK: _ROOK, QUEEN: _QUEEN,
+                           KING: _KING_ENDGAME}
+
+def _combine(values: tuple, tables: dict) -> tuple:
+    '''Folds material into the tables, indexed by piece code then square, negated and mirrored for black'''
+    combined: list = [(0,) * 64] * 16
+    for kind, table in tables.items():
+        combined[WHITE << 3 | kind] = tuple(values[kind] + table[square] for square in range(64))
+        # square ^ 56 flips the rank, so black reads the table from its own side
+        combined[BLACK << 3 | kind] = tuple(-values[kind] - table[square ^ 56] for square in range(64))
+    return tuple(combined)
+
+# Signed white relative score of each piece code on each square
+MG_TABLE: Final[tuple] = _combine(MG_VALUES, _MG_TABLES)
+EG_TABLE: Final[tuple] = _combine(EG_VALUES, _EG_TABLES)
+# Phase weight of each piece code
+PHASE_TABLE: Final[tuple] = tuple(PHASE_WEIGHTS[code & 7] if code & 7 <= KING else 0 for code in range(16))
+
+def evaluate(board: object) -> int:
+    '''Returns the tapered score in centipawns from the point of view of the side to move'''
+    phase: int = min(board.phase, MAX_PHASE)
+    score: int = (board.mg_score * phase + board.eg_score * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if board.side == WHITE else -score
+
+def compute_scores(board: object) -> tuple[int, int, int]:
+    '''Sums the middlegame score, endgame score and phase from scratch, used to check the incremental values'''
+    mg_score: int = 0
+    eg_score: int = 0
+    phase: int = 0
+    for square, code in enumerate(board.squares):
+        if code:
+            mg_score += MG_TABLE[code][square]
+            eg_score += EG_TABLE[code][square]
+            phase += PHASE_TABLE[code]
+    return mg_score, eg_score, phase
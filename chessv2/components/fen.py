@@ -0,0 +1,117 @@
+'''This module parses and writes Forsyth-Edwards Notation with translation tables
+Placements are expanded and compressed by str and bytes translate calls, so no Python loop runs per square'''
+from __future__ import annotations
+from typing import Final, Iterable, NamedTuple
+from .bitboard import WHITE, BLACK, PAWN, FEN_TO_CODE, CODE_TO_FEN, FEN_CASTLING, parse_square, square_name
+
+__all__ = ("START_FEN", "FenPosition", "parse_fen", "format_fen", "from_fens", "to_fens")
+
+START_FEN: Final[str] = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# Marks a character that is not part of a placement field after translation
+_INVALID: Final[int] = 255
+# Digits become runs of dots, the ranks are then exactly 8 characters each between the slashes
+_EXPAND_DIGITS: Final[dict] = str.maketrans({str(count): '.' * count for count in range(1, 9)})
+# Placement characters to piece codes, a dot being an empty square
+_CHAR_TO_CODE: Final[bytes] = bytes(
+    FEN_TO_CODE.get(chr(char), 0 if chr(char) == '.' else _INVALID) for char in range(256))
+# Piece codes to placement characters, empty squares become '1' to be merged into runs afterwards
+_CODE_TO_CHAR: Final[bytes] = bytes(ord(CODE_TO_FEN.get(code, '1')) for code in range(256))
+# Runs of empty squares longest first, so each replace only sees runs no other replace will merge
+_EMPTY_RUNS: Final[tuple] = tuple(('1' * count, str(count)) for count in range(8, 1, -1))
+# Where the slashes of an expanded placement must be
+_RANK_ENDS: Final[str] = '/' * 7
+_CASTLING_ORDER: Final[tuple] = tuple(FEN_CASTLING.items())
+# Largest clock a FEN may give, the clocks are stored as unsigned shorts by the encoding module
+MAX_CLOCK: Final[int] = 0xFFFF
+
+class FenPosition(NamedTuple):
+    '''Every field of a FEN, named like the Board attributes so format_fen takes either'''
+    squares: bytes
+    side: int
+    castling: int
+    ep_square: int
+    half_move_counter: int
+    full_move_counter: int
+
+def _parse_placement(field: str) -> bytes:
+    '''Returns the 64 piece codes of a placement field, a8 first, raising ValueError if it is malformed'''
+    expanded: str = field.translate(_EXPAND_DIGITS)
+    if len(expanded) != 71 or expanded[8::9] != _RANK_ENDS:
+        raise ValueError(f'placement {field!r} does not have 8 ranks of 8 squares')
+    squares: bytes = expanded.replace('/', '').encode('latin-1', 'replace').translate(_CHAR_TO_CODE)
+    if _INVALID in squares:
+        raise ValueError(f'placement {field!r} has an unknown piece')
+    return squares
+
+def _parse_castling(field: str) -> int:
+    '''Returns the castling mask of a castling field'''
+    if field == '-':
+        return 0
+    castling: int = 0
+    for char in field:
+        right: int = FEN_CASTLING.get(char, 0)
+        if not right:
+            raise ValueError(f'castling field {field!r} has an unknown right')
+        castling |= right
+    return castling
+
+def _parse_ep_square(field: str) -> int:
+    '''Returns the square of an en passant field, -1 for none'''
+    if field == '-':
+        return -1
+    if len(field) != 2 or field[0] not in 'abcdefgh' or field[1] not in '36':
+        raise ValueError(f'en passant field {field!r} is not a square on the third or sixth rank')
+    return parse_square(field)
+
+def _check_ep_square(squares: bytes, side: int, ep_square: int) -> None:
+    '''Raises ValueError unless the en passant square is one the last move could have left
+    The enemy pawn must stand just past it, and it and the square the pawn came from must be empty'''
+    if ep_square == -1:
+        return
+    forward: int = -8 if side == WHITE else 8
+    if ep_square >> 3 != (2 if side == WHITE else 5) or squares[ep_square - forward] != (side ^ 1) << 3 | PAWN \
+            or squares[ep_square] or squares[ep_square + forward]:
+        raise ValueError(f'en passant square {square_name(ep_square)} does not follow a double pawn push')
+
+def parse_fen(fen: str) -> FenPosition:
+    '''Parses every field of a FEN, the clocks may be left out as in EPD and default to 0 and 1
+    Raises ValueError naming the first field that is malformed'''
+    fields: list[str] = fen.split()
+    if not 1 <= len(fields) <= 6:
+        raise ValueError(f'{fen!r} does not have between 1 and 6 fields')
+    squares: bytes = _parse_placement(fields[0])
+    side_field: str = fields[1] if len(fields) > 1 else 'w'
+    if side_field not in ('w', 'b'):
+        raise ValueError(f'side to move {side_field!r} is not w or b')
+    castling: int = _parse_castling(fields[2]) if len(fields) > 2 else 0
+    side: int = BLACK if side_field == 'b' else WHITE
+    ep_square: int = _parse_ep_square(fields[3]) if len(fields) > 3 else -1
+    _check_ep_square(squares, side, ep_square)
+    try:
+        half_move: int = int(fields[4]) if len(fields) > 4 else 0
+        full_move: int = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise ValueError(f'clocks of {fen!r} are not numbers') from None
+    if not (0 <= half_move <= MAX_CLOCK and 0 <= full_move <= MAX_CLOCK):
+        raise ValueError(f'clocks of {fen!r} are not between 0 and {MAX_CLOCK}')
+    return FenPosition(squares, side, castling, ep_square, half_move, full_move)
+
+def format_fen(position: object) -> str:
+    '''Writes the FEN of a Board or FenPosition'''
+    chars: str = position.squares.translate(_CODE_TO_CHAR).decode('ascii')
+    placement: str = '/'.join((chars[0:8], chars[8:16], chars[16:24], chars[24:32],
+                               chars[32:40], chars[40:48], chars[48:56], chars[56:64]))
+    for run, count in _EMPTY_RUNS:
+        placement = placement.replace(run, count)
+    castling: str = ''.join(char for char, right in _CASTLING_ORDER if position.castling & right) or '-'
+    ep_square: str = square_name(position.ep_square) if position.ep_square != -1 else '-'
+    return f"{placement} {'b' if position.side else 'w'} {castling} {ep_square} " \
+        f'{position.half_move_counter} {position.full_move_counter}'
+
+def from_fens(fens: Iterable[str]) -> list[FenPosition]:
+    '''Parses many FENs at once, load each into a Board with Board.load_position'''
+    return [parse_fen(fen) for fen in fens]
+
+def to_fens(positions: Iterable[object]) -> list[str]:
+    '''Writes the FEN of many Boards or FenPositions at once'''
+    return [format_fen(position) for position in positions]
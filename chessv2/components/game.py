@@ -4,13 +4,41 @@ import pygame
 from pygame.locals import *
 from pygame import surface
 from .board import Board
+from .book import OpeningBook
+from .engine import EngineWorker, EngineReport
+from .metrics import timed
+from .pgn import game_result
+from .renderer import Renderer
+from .search import Search, SearchResult
+from .transposition import TranspositionTable
+
+# Posted to the pygame queue for every report of the background engine, the report is in event.report
+ENGINE_EVENT: int = pygame.event.custom_type()
 
 class Game:
     '''Game object'''
-    def __init__(self, win: surface) -> None:
-        '''Initializes the game object'''
+    def __init__(self, win: surface, ai_color: str = None, think_time: float = 1.0, background: bool = True,
+                 workers: int = 1, book: str = None) -> None:
+        '''Initializes the game object, ai_color is the side played by the engine if any
+        think_time bounds how many seconds the engine spends on each move
+        background runs the engine in its own process so the window keeps drawing while it thinks,
+        workers is how many processes that engine searches with, book is an opening book file played from
+        before the engine searches'''
+        self.ai_color: str = ai_color
+        self.think_time: float = think_time
+        self.engine: EngineWorker = EngineWorker(self._post_report, workers=workers) \
+            if background and ai_color else None
+        # Kept across moves and resets so the engine reuses earlier results, only the synchronous engine
+        # searches with it, a background engine has its own
+        self.table: TranspositionTable = TranspositionTable() if ai_color and self.engine is None else None
+        self.book: OpeningBook = OpeningBook(book) if book else None
+        # Request id of the search the game is waiting on, 0 when the engine is idle
+        self.thinking: int = 0
+        # Latest depth reported by the engine for the current search
+        self.analysis: SearchResult = None
         self._init()
         self.win: surface = win
+        self.renderer: Renderer = Renderer(win)
 
     def _init(self) -> None:
         '''Initializes the game'''
@@ -18,33 +46,50 @@ class Game:
         self.board: object = Board()
         self.turn: str = "white"
         self.valid_moves: dict = {}
+        # Position the game started from and the encoded moves played since, for pgn.write_game
+        self.start_fen: str = self.board.board_to_fen()
+        self.moves: list[int] = []
+        # Result tag of the game, * until it is won or drawn
+        self.outcome: str = game_result(self.board)
+        if self.turn == self.ai_color:
+            self.ai_move()
 
-    def update(self) -> None:
-        '''Updates the game'''
-        self.board.draw_squares(self.win)
-        self.draw_valid_moves(self.valid_moves)
-        pygame.display.update()
+    def update(self) -> bool:
+        '''Redraws what changed since the last frame, returns False when the frame was skipped'''
+        return self.renderer.render(self.board, self.valid_moves)
 
     def reset(self) -> None:
-        '''Resets the game'''
+        '''Resets the game, abandoning any search still running'''
+        self.cancel_thinking()
+        self.board.release_views()
         self._init()
 
+    def close(self) -> None:
+        '''Shuts the background engine down and closes the opening book'''
+        if self.engine is not None:
+            self.engine.close()
+        if self.book is not None:
+            self.book.close()
+
+    @timed()
     def select(self, pos: int) -> bool:
-        '''Selects a piece and returns True if a piece is selected'''
+        '''Selects a piece and returns True if a piece is selected, nothing can be selected once the game is over'''
+        if self.thinking or self.outcome != '*':
+            return False
         if self.selected:
-            destination: int = self._move(pos)
-            if not destination:
+            if self._move(pos):
+                # the move is made, the piece that moved or the engine's reply must not be selected in its place
                 self.selected = None
-                self.select(pos)
+                return False
+            self.selected = None
         piece: object = self.board.get_piece(pos)
 
         if piece != 0 and piece.color == self.turn:
             self.selected = piece
-            if piece.valid_moves == []:
+            if not piece.valid_moves:
                 self.valid_moves = self.board.get_valid_moves(piece)
             else:
                 self.valid_moves = piece.valid_moves
-                print(piece.valid_moves)
             return True
         return False
     
@@ -52,24 +97,67 @@ class Game:
         '''Moves the piece on the board'''
         piece: object = self.board.get_piece(pos)
         if self.selected and piece == 0 and pos in self.valid_moves:
-            self.board.move(self.selected, pos)
+            self.moves.append(self.board.move(self.selected, pos))
             self.change_turn()
         elif self.selected and piece != 0 and piece.color != self.turn and pos in self.valid_moves:
-            self.board.capture(self.selected, pos)
+            self.moves.append(self.board.capture(self.selected, pos))
             self.change_turn()
         else:
             return False
+        self.cancel_thinking()
+        if self.turn == self.ai_color and self.outcome == '*':
+            self.ai_move()
         return True
+
+    def ai_move(self) -> None:
+        '''Lets the engine search the position and play its move for the side to move
+        A move from the opening book is played straight away without searching,
+        with a background engine the move is played later, when its ENGINE_EVENT arrives'''
+        book_move: int = self.book.choose(self.board) if self.book is not None else 0
+        if book_move:
+            self.moves.append(self.board.play(book_move))
+            self.change_turn()
+            return
+        if self.engine is not None:
+            self.analysis = None
+            self.thinking = self.engine.start(self.board.board_to_fen(), self.think_time)
+            return
+        result = Search(self.board, self.table).search(time_limit=self.think_time)
+        if result.move:
+            self.moves.append(self.board.play(result.move))
+            self.change_turn()
+
+    def cancel_thinking(self) -> None:
+        '''Stops the background engine and forgets the search the game was waiting on'''
+        if self.engine is not None and self.thinking:
+            self.engine.cancel()
+        self.thinking = 0
+
+    def handle_engine_event(self, event: pygame.event.Event) -> None:
+        '''Records engine progress and plays the engine's move once its search is done'''
+        report: EngineReport = event.report
+        if report.request_id != self.thinking:
+            return
+        self.analysis = report.result
+        if report.done:
+            self.thinking = 0
+            if report.result.move:
+                self.moves.append(self.board.play(report.result.move))
+                self.change_turn()
+
+    def _post_report(self, report: EngineReport) -> None:
+        '''Hands an engine report from the listener thread to the pygame event queue'''
+        pygame.event.post(pygame.event.Event(ENGINE_EVENT, report=report))
         
+    def draw_reason(self) -> str:
+        '''Returns why the game was drawn by rule, or an empty string when it was not'''
+        return self.board.draw_reason()
+
     def change_turn(self) -> None:
-        '''This function changes the turn'''
+        '''This function changes the turn and records the result once the game is won or drawn'''
+        self.outcome = game_result(self.board)
         self.valid_moves.clear()
         if self.turn == 'white':
             self.turn = 'black'
         else:
             self.turn = 'white'
-
-    def draw_valid_moves(self, valid_moves: dict) -> None:
-        '''This method draws the valid moves for the selected piece'''
-        for move in valid_moves:
-            pygame.draw.circle(self.win, (15,10,75), (move % 8 * 100 + 50, int(move / 8) * 100 + 50), 20)
\ No newline at end of file
@@ -0,0 +1,149 @@
+'''This module holds the opt in instrumentation: event counters, per function timings and a cProfile switch
+Everything is off until enabled, where it is wired into hot paths it costs one flag check per call.
+The game and the server turn it on with --metrics and toggle the profiler while they run'''
+from __future__ import annotations
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import time
+from typing import Callable, Final, TypeVar
+
+# Counters kept by the rules core and the search
+MOVE_GENERATIONS: Final[str] = 'move_generations'
+CHECKS: Final[str] = 'checks'
+MOVES_MADE: Final[str] = 'moves_made'
+# Timing of Renderer.render, one sample per drawn frame
+RENDER_FRAME: Final[str] = 'render_frame'
+LOG_FORMAT: Final[str] = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+# Functions listed when profiler statistics are reported
+PROFILE_LINES: Final[int] = 25
+
+_Function = TypeVar('_Function', bound=Callable)
+
+class Timing:
+    '''Calls and seconds spent in one timed function'''
+    __slots__ = ('calls', 'total', 'worst')
+    calls: int
+    total: float
+    worst: float
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.total: float = 0.0
+        self.worst: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        '''Records one call that took seconds'''
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.worst:
+            self.worst = seconds
+
+class Metrics:
+    '''Counters and timings gathered while enabled, with a cProfile profiler that can be started and stopped
+    at any time. Callers check enabled before counting so a disabled layer costs next to nothing'''
+    __slots__ = ('enabled', 'counters', 'timings', 'started', 'profiler')
+    enabled: bool
+    counters: dict[str, int]
+    timings: dict[str, Timing]
+    started: float
+    profiler: cProfile.Profile
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.counters: dict[str, int] = {}
+        self.timings: dict[str, Timing] = {}
+        self.started: float = time.perf_counter()
+        self.profiler: cProfile.Profile = None
+
+    def enable(self, enabled: bool = True) -> None:
+        '''Turns counting and timing on or off, the figures gathered so far are kept'''
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        '''Forgets every counter and timing and restarts the clock the rates are measured against'''
+        self.counters = {}
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        '''Adds to a counter'''
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name: str, seconds: float) -> None:
+        '''Adds one timed call'''
+        timing: Timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = Timing()
+        timing.add(seconds)
+
+    def snapshot(self) -> dict:
+        '''Returns the counters with their rates per second and the timings in milliseconds, ready for JSON'''
+        elapsed: float = time.perf_counter() - self.started
+        return {'elapsed': round(elapsed, 3),
+                'counters': dict(self.counters),
+                'rates': {name: round(value / elapsed, 1) for name, value in self.counters.items()} if elapsed else {},
+                'timings': {name: {'calls': timing.calls, 'total_ms': round(timing.total * 1000, 3),
+                                   'mean_ms': round(timing.total * 1000 / timing.calls, 3),
+                                   'max_ms': round(timing.worst * 1000, 3)}
+                            for name, timing in self.timings.items()}}
+
+    def report(self) -> str:
+        '''Returns the snapshot as lines of text'''
+        snapshot: dict = self.snapshot()
+        lines: list[str] = [f"metrics over {snapshot['elapsed']:.3f}s"]
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"  {name:<24} {value:>12}  {snapshot['rates'].get(name, 0):>12.1f}/s")
+        for name, timing in sorted(snapshot['timings'].items()):
+            lines.append(f"  {name:<24} {timing['calls']:>12} calls  mean {timing['mean_ms']:.3f}ms"
+                         f"  max {timing['max_ms']:.3f}ms")
+        return '\n'.join(lines)
+
+    @property
+    def profiling(self) -> bool:
+        '''Returns True while the profiler runs'''
+        return self.profiler is not None
+
+    def start_profile(self) -> None:
+        '''Starts profiling every function call of this process'''
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self, lines: int = PROFILE_LINES, path: str = None) -> str:
+        '''Stops the profiler and returns the functions with the most time of their own
+        The raw statistics are also dumped to path for pstats or snakeviz when given'''
+        if self.profiler is None:
+            return ''
+        profiler: cProfile.Profile = self.profiler
+        self.profiler = None
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+        out: io.StringIO = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('tottime').print_stats(lines)
+        return out.getvalue()
+
+# The process wide instance every module reports to
+METRICS: Final[Metrics] = Metrics()
+
+def timed(name: str = None) -> Callable[[_Function], _Function]:
+    '''Decorates a function so every call is timed under name, its qualified name by default, while metrics
+    are enabled. Meant for calls such as frames and requests, not for the inner loops of the search'''
+    def decorator(function: _Function) -> _Function:
+        label: str = name or function.__qualname__
+        @functools.wraps(function)
+        def wrapper(*args: object, **kwargs: object) -> object:
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            start: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.record(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def configure_logging(level: str = 'WARNING') -> None:
+    '''Sends log records at level or above to standard error, debug shows the move lists of the board'''
+    logging.basicConfig(level=level.upper(), format=LOG_FORMAT)
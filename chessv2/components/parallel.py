@@ -0,0 +1,184 @@
+'''This module splits the root moves of a search between worker processes so every core takes part
+Run the scaling benchmark from the repository root with: python -m chessv2.components.parallel --help'''
+from __future__ import annotations
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Callable, Final
+from .board import Board
+from .bitboard import generate_legal_moves, move_to_uci
+from .perft import REFERENCE_POSITIONS
+from .search import Search, SearchResult, MATE_BOUND, MAX_PLY
+from .tablebase import Tablebase
+from .transposition import TranspositionTable
+
+# Seconds between two checks of stop_check while the workers run
+POLL_INTERVAL: Final[float] = 0.05
+
+class WorkerState:
+    '''What a worker process keeps from one task to the next: a headless board, its own transposition table,
+    the tablebases if a directory was given and the shared stop value of a ParallelSearch if any'''
+    __slots__ = ('board', 'table', 'tablebase', 'stopped')
+    board: Board
+    table: TranspositionTable
+    tablebase: Tablebase
+    stopped: object
+    def __init__(self, table_megabytes: float, tablebase_directory: str = None, stopped: object = None) -> None:
+        self.board: Board = Board(views=False)
+        self.table: TranspositionTable = TranspositionTable(table_megabytes)
+        self.tablebase: Tablebase = Tablebase(tablebase_directory) if tablebase_directory else None
+        self.stopped: object = stopped
+
+# State of this process when it is a pool worker, set up once by _init_worker
+_worker: WorkerState = None
+
+def default_workers() -> int:
+    '''Returns the number of cores this process may use'''
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+
+def _init_worker(table_megabytes: float, tablebase_directory: str, stopped: object) -> None:
+    '''Builds the state a worker reuses for every task it is given'''
+    global _worker
+    _worker = WorkerState(table_megabytes, tablebase_directory, stopped)
+
+def worker_state() -> WorkerState:
+    '''Returns the state of the pool worker running the calling task'''
+    return _worker
+
+def worker_pool(workers: int = None, table_megabytes: float = 16, tablebase_directory: str = None,
+                stopped: object = None) -> ProcessPoolExecutor:
+    '''Starts a spawn pool whose processes each build a WorkerState once, tasks get it from worker_state
+    workers defaults to the number of cores, stopped must come from the spawn context to be shared'''
+    return ProcessPoolExecutor(workers or default_workers(), mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker, initargs=(table_megabytes, tablebase_directory, stopped))
+
+def _search_share(search_id: int, fen: str, moves: list[int], max_depth: int,
+                  time_limit: float) -> tuple[list[SearchResult], int]:
+    '''Searches the position with the root limited to moves and returns the result of every completed depth
+    The table is cleared first so the answer does not depend on which worker ran the share before'''
+    worker: WorkerState = _worker
+    worker.board.fen_to_board(fen, views=False)
+    worker.table.clear()
+    results: list[SearchResult] = []
+    final: SearchResult = Search(worker.board, worker.table).search(
+        max_depth, time_limit, callback=results.append, stop_check=lambda: worker.stopped.value >= search_id,
+        root_moves=moves)
+    return results, final.nodes
+
+def _result_at(results: list[SearchResult], depth: int) -> SearchResult:
+    '''Returns the deepest result of a share that does not go past depth'''
+    best: SearchResult = results[0]
+    for result in results:
+        if result.depth <= depth:
+            best = result
+    return best
+
+class ParallelSearch:
+    '''Searches with a pool of worker processes, each taking every nth root move
+    Each share deepens on its own, the merge takes the deepest depth every share completed and the best
+    score there, ties going to the move ordered first, so a fixed depth always gives the same move'''
+    __slots__ = ('board', 'workers', 'pool', 'stopped', 'last_search')
+    board: Board
+    workers: int
+    pool: ProcessPoolExecutor
+    stopped: object
+    last_search: int
+    def __init__(self, board: Board, workers: int = None, table_megabytes: float = 16) -> None:
+        '''Starts the worker processes, workers defaults to the number of cores
+        Every worker has its own table of table_megabytes'''
+        self.board: Board = board
+        self.workers: int = workers or default_workers()
+        # Highest search id the workers should abandon
+        self.stopped: object = multiprocessing.get_context('spawn').Value('q', 0)
+        self.last_search: int = 0
+        self.pool: ProcessPoolExecutor = worker_pool(self.workers, table_megabytes, stopped=self.stopped)
+
+    def search(self, max_depth: int = MAX_PLY, time_limit: float = None,
+               callback: Callable[[SearchResult], None] = None,
+               stop_check: Callable[[], bool] = None) -> SearchResult:
+        '''Searches the board's position like Search.search, the callback receives only the merged result'''
+        start: float = time.perf_counter()
+        self.last_search += 1
+        search_id: int = self.last_search
+        board: Board = self.board
+        moves: list[int] = generate_legal_moves(board)
+        if len(moves) <= 1:
+            result: SearchResult = Search(board, TranspositionTable(1)).search(max_depth, time_limit)
+        else:
+            # deal the ordered moves out in turn so every share gets some of the promising ones
+            Search(board, TranspositionTable(1)).order_root_moves(moves)
+            fen: str = board.board_to_fen()
+            shares: list[list[int]] = [moves[index::self.workers] for index in range(min(self.workers, len(moves)))]
+            futures: list[Future] = [self.pool.submit(_search_share, search_id, fen, share, max_depth, time_limit)
+                                     for share in shares]
+            while wait(futures, timeout=POLL_INTERVAL).not_done:
+                if stop_check is not None and stop_check():
+                    self.stop()
+            result = self._merge([future.result() for future in futures], moves, start)
+        if callback is not None:
+            callback(result)
+        return result
+
+    def stop(self) -> None:
+        '''Asks the workers to return their best moves so far'''
+        self.stopped.value = self.last_search
+
+    def close(self) -> None:
+        '''Stops the worker processes'''
+        self.stop()
+        self.pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _merge(shares: list[tuple[list[SearchResult], int]], moves: list[int], start: float) -> SearchResult:
+        '''Picks the best move at the deepest depth every share reached, a share that found a mate counts
+        as reaching any depth since searching it deeper cannot change its score'''
+        nodes: int = sum(share_nodes for _, share_nodes in shares)
+        finished: list[list[SearchResult]] = [results for results, _ in shares if results]
+        elapsed: float = time.perf_counter() - start
+        if not finished:
+            return SearchResult(moves[0], 0, 0, nodes, elapsed)
+        unsettled: list[int] = [results[-1].depth for results in finished if abs(results[-1].score) < MATE_BOUND]
+        depth: int = min(unsettled) if unsettled else max(results[-1].depth for results in finished)
+        best: SearchResult = max((_result_at(results, depth) for results in finished),
+                                 key=lambda result: (result.score, -moves.index(result.move)))
+        return SearchResult(best.move, best.score, depth, nodes, elapsed)
+
+def run_scaling(fen: str, depth: int, worker_counts: list[int], out: object = sys.stdout) -> list[tuple]:
+    '''Searches the position to a fixed depth with each worker count, printing the speedup over the first count
+    Returns (workers, move, score, nodes, seconds) for each count'''
+    board: Board = Board(views=False)
+    board.fen_to_board(fen, views=False)
+    rows: list[tuple] = []
+    for workers in worker_counts:
+        if workers == 1:
+            engine: object = Search(board)
+            result: SearchResult = engine.search(depth)
+        else:
+            engine = ParallelSearch(board, workers)
+            # the first search pays for starting the processes, so warm the pool up before timing
+            engine.search(1)
+            result = engine.search(depth)
+            engine.close()
+        rows.append((workers, result.move, result.score, result.nodes, result.elapsed))
+        base: float = rows[0][4]
+        print(f'workers {workers:>2}  {move_to_uci(result.move)}  score {result.score:>6}  {result.nodes:>9} nodes  '
+              f'{result.elapsed:8.3f}s  {result.nodes / result.elapsed if result.elapsed else 0:>9.0f} nps  '
+              f'speedup {base / result.elapsed if result.elapsed else 0:5.2f}x', file=out)
+    return rows
+
+def main(argv: list[str] = None) -> int:
+    '''Parses the command line and runs the scaling benchmark'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Parallel search scaling benchmark')
+    parser.add_argument('--fen', default=REFERENCE_POSITIONS[5][1], help='position to search, defaults to a middlegame')
+    parser.add_argument('--depth', type=int, default=4, help='fixed depth to search to')
+    parser.add_argument('--workers', type=int, nargs='+', help='worker counts to compare, defaults to 1 up to every core')
+    args: argparse.Namespace = parser.parse_args(argv)
+    cores: int = default_workers()
+    run_scaling(args.fen, args.depth, args.workers or sorted(count for count in {1, 2, 4, cores} if count <= cores))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
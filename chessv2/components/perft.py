@@ -0,0 +1,93 @@
+'''This module counts move generation leaf nodes (perft) to check correctness and measure speed
+Run it from the repository root with: python -m chessv2.components.perft --help'''
+from __future__ import annotations
+import argparse
+import sys
+import time
+from typing import Final
+from .board import Board
+from .bitboard import move_to_uci
+from .fen import START_FEN
+
+# Standard reference positions with their node counts by depth
+REFERENCE_POSITIONS: Final[tuple] = (
+    ('start', START_FEN, (20, 400, 8902, 197281, 4865609)),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     (48, 2039, 97862, 4085603)),
+    ('rook endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', (14, 191, 2812, 43238, 674624)),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     (6, 264, 9467, 422333)),
+    ('discovered checks', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', (44, 1486, 62379, 2103487)),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     (46, 2079, 89890, 3894594)),
+)
+
+def perft(board: Board, depth: int) -> int:
+    '''Counts the leaf nodes of the legal move tree to the given depth'''
+    moves: list[int] = board.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes: int = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move(move)
+    return nodes
+
+def divide(board: Board, depth: int) -> dict[str, int]:
+    '''Returns the perft count below each root move, keyed by the move in long algebraic notation'''
+    counts: dict[str, int] = {}
+    for move in board.legal_moves():
+        board.make_move(move)
+        counts[move_to_uci(move)] = perft(board, depth - 1)
+        board.unmake_move(move)
+    return counts
+
+def timed_perft(board: Board, depth: int) -> tuple[int, float]:
+    '''Runs perft and returns the node count with the elapsed seconds'''
+    start: float = time.perf_counter()
+    nodes: int = perft(board, depth)
+    return nodes, time.perf_counter() - start
+
+def run_suite(max_depth: int, out: object = sys.stdout) -> bool:
+    '''Runs every reference position up to max_depth, printing nodes per second, and returns True if all counts match'''
+    board: Board = Board(views=False)
+    passed: bool = True
+    for name, fen, expected in REFERENCE_POSITIONS:
+        board.fen_to_board(fen, views=False)
+        for depth, expected_nodes in enumerate(expected[:max_depth], start=1):
+            nodes, elapsed = timed_perft(board, depth)
+            status: str = 'ok' if nodes == expected_nodes else f'FAIL expected {expected_nodes}'
+            passed = passed and nodes == expected_nodes
+            print(f'{name:<18} depth {depth}  {nodes:>10} nodes  {elapsed:8.3f}s  '
+                  f'{nodes / elapsed if elapsed else 0:>10.0f} nps  {status}', file=out)
+    return passed
+
+def main(argv: list[str] = None) -> int:
+    '''Parses the command line and runs perft, divide or the reference suite'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Move generator perft counts')
+    parser.add_argument('--fen', default=START_FEN, help='position to search, defaults to the start position')
+    parser.add_argument('--depth', type=int, default=3, help='depth to count to')
+    parser.add_argument('--divide', action='store_true', help='print the count below each root move')
+    parser.add_argument('--suite', action='store_true', help='check the reference positions up to --depth')
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.suite:
+        return 0 if run_suite(args.depth) else 1
+    board: Board = Board(views=False)
+    board.fen_to_board(args.fen, views=False)
+    if args.divide:
+        start: float = time.perf_counter()
+        counts: dict[str, int] = divide(board, args.depth)
+        elapsed: float = time.perf_counter() - start
+        for move, nodes in sorted(counts.items()):
+            print(f'{move}: {nodes}')
+        total: int = sum(counts.values())
+        print(f'\nMoves: {len(counts)}\nNodes: {total}\nTime: {elapsed:.3f}s')
+        return 0
+    for depth in range(1, args.depth + 1):
+        nodes, elapsed = timed_perft(board, depth)
+        print(f'depth {depth}  {nodes:>10} nodes  {elapsed:8.3f}s  {nodes / elapsed if elapsed else 0:>10.0f} nps')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
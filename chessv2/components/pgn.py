@@ -0,0 +1,256 @@
+'''This module reads and writes games in Portable Game Notation
+Games are parsed one at a time from any line iterable, so archives of any size stream through in constant memory.
+Run the throughput benchmark from the repository root with: python -m chessv2.components.pgn --help'''
+from __future__ import annotations
+import argparse
+import re
+import sys
+import time
+from typing import Final, Iterable, Iterator, NamedTuple, TextIO, TYPE_CHECKING
+from .board import Board
+from .bitboard import WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, CAPTURE, PROMOTION, KING_CASTLE, QUEEN_CASTLE, \
+    PROMOTION_PIECES, generate_legal_moves, is_square_attacked, parse_square, square_name
+from .perft import START_FEN
+if TYPE_CHECKING:
+    from .game import Game
+
+RESULTS: Final[frozenset] = frozenset(('1-0', '0-1', '1/2-1/2', '*'))
+# Tags every exported game starts with, in this order
+SEVEN_TAG_ROSTER: Final[tuple] = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+# Longest movetext line written, as the standard asks
+LINE_LENGTH: Final[int] = 80
+
+_PIECE_LETTERS: Final[dict] = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+_SAN_LETTERS: Final[str] = '  NBRQK'
+_TAG_RE: Final[re.Pattern] = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_COMMENT_RE: Final[re.Pattern] = re.compile(r'\{[^}]*\}|;[^\n]*')
+_TOKEN_RE: Final[re.Pattern] = re.compile(r'[()]|[^\s()]+')
+_MOVE_NUMBER_RE: Final[re.Pattern] = re.compile(r'^\d+\.*')
+_ESCAPE_RE: Final[re.Pattern] = re.compile(r'\\(.)')
+
+class PGNGame(NamedTuple):
+    '''A game as read from a file: its tags, its main line moves in SAN and its result'''
+    headers: dict[str, str]
+    moves: list[str]
+    result: str
+
+def _in_check(board: Board) -> bool:
+    '''Returns True if the side to move is in check'''
+    king: int = board.bitboards[board.side << 3 | KING]
+    return bool(king) and is_square_attacked(board, king.bit_length() - 1, board.side ^ 1)
+
+def move_to_san(board: Board, move: int, legal_moves: list[int] = None) -> str:
+    '''Returns the standard algebraic notation of a legal move in the board's position, such as Nbd7 or exd8=Q+
+    Pass the legal moves when they are already known to save generating them again'''
+    flag: int = move >> 12
+    start: int = move & 63
+    end: int = move >> 6 & 63
+    if flag == KING_CASTLE:
+        san: str = 'O-O'
+    elif flag == QUEEN_CASTLE:
+        san = 'O-O-O'
+    else:
+        code: int = board.squares[start]
+        kind: int = code & 7
+        if kind == PAWN:
+            san = square_name(start)[0] + 'x' if flag & CAPTURE else ''
+        else:
+            san = _SAN_LETTERS[kind]
+            rivals: list[int] = [other & 63 for other in legal_moves or generate_legal_moves(board)
+                                 if other >> 6 & 63 == end and other & 63 != start
+                                 and board.squares[other & 63] == code]
+            if rivals:
+                if all(rival & 7 != start & 7 for rival in rivals):
+                    san += square_name(start)[0]
+                elif all(rival >> 3 != start >> 3 for rival in rivals):
+                    san += square_name(start)[1]
+                else:
+                    san += square_name(start)
+            if flag & CAPTURE:
+                san += 'x'
+        san += square_name(end)
+        if flag & PROMOTION:
+            san += '=' + _SAN_LETTERS[PROMOTION_PIECES[flag & 3]]
+    board.make_move(move)
+    if _in_check(board):
+        san += '#' if not generate_legal_moves(board) else '+'
+    board.unmake_move(move)
+    return san
+
+def san_to_move(board: Board, san: str) -> int:
+    '''Returns the legal move a SAN string such as e4, Nbd7, exd8=Q or O-O names, raising ValueError if there is none'''
+    text: str = san.rstrip('+#!?')
+    moves: list[int] = generate_legal_moves(board)
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        flag: int = KING_CASTLE if len(text) == 3 else QUEEN_CASTLE
+        for move in moves:
+            if move >> 12 == flag:
+                return move
+        raise ValueError(f'{san} is not a legal move')
+    promotion: int = 0
+    if '=' in text:
+        text, _, letter = text.partition('=')
+        promotion = _PIECE_LETTERS.get(letter[:1].upper(), -1)
+    elif text[-1:] in 'NBRQ' and text[-2:-1].isdigit():
+        promotion = _PIECE_LETTERS[text[-1]]
+        text = text[:-1]
+    kind: int = _PIECE_LETTERS.get(text[:1], PAWN)
+    try:
+        end: int = parse_square(text[-2:])
+    except (ValueError, IndexError):
+        raise ValueError(f'{san} is not a move') from None
+    hint: str = text[1 if kind != PAWN else 0:-2].replace('x', '').replace('-', '')
+    found: int = 0
+    for move in moves:
+        start: int = move & 63
+        if move >> 6 & 63 != end or board.squares[start] & 7 != kind:
+            continue
+        if move >> 12 & PROMOTION and PROMOTION_PIECES[move >> 12 & 3] != promotion:
+            continue
+        name: str = square_name(start)
+        if any(char not in name for char in hint):
+            continue
+        if found:
+            raise ValueError(f'{san} is ambiguous')
+        found = move
+    if not found:
+        raise ValueError(f'{san} is not a legal move')
+    return found
+
+def parse_movetext(text: str) -> tuple[list[str], str]:
+    '''Returns the main line SAN moves and the result of a game's movetext
+    Comments, variations, numeric annotation glyphs and move numbers are skipped'''
+    moves: list[str] = []
+    result: str = '*'
+    depth: int = 0
+    for token in _TOKEN_RE.findall(_COMMENT_RE.sub(' ', text)):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth or token[0] == '$':
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            token = _MOVE_NUMBER_RE.sub('', token)
+            if token:
+                moves.append(token)
+    return moves, result
+
+def read_games(lines: Iterable[str]) -> Iterator[PGNGame]:
+    '''Yields each game of a PGN stream as soon as its movetext ends, holding only one game in memory'''
+    headers: dict[str, str] = {}
+    movetext: list[str] = []
+    for line in lines:
+        if line[:1] == '[':
+            if movetext:
+                yield PGNGame(headers, *parse_movetext(''.join(movetext)))
+                headers = {}
+                movetext = []
+            match: re.Match = _TAG_RE.match(line)
+            if match:
+                headers[match.group(1)] = _ESCAPE_RE.sub(r'\1', match.group(2))
+        elif line[:1] != '%' and (movetext or line.strip()):
+            movetext.append(line)
+    if headers or movetext:
+        yield PGNGame(headers, *parse_movetext(''.join(movetext)))
+
+def replay(game: PGNGame, board: Board = None) -> list[int]:
+    '''Plays a game's moves on the board, from its FEN tag if it has one, and returns them encoded
+    Raises ValueError naming the ply of the first move that is not legal'''
+    board = board if board is not None else Board(views=False)
+    board.fen_to_board(game.headers.get('FEN', START_FEN), views=False)
+    moves: list[int] = []
+    for ply, san in enumerate(game.moves, start=1):
+        try:
+            move: int = san_to_move(board, san)
+        except ValueError as error:
+            raise ValueError(f'ply {ply}: {error}') from None
+        board.make_move(move)
+        moves.append(move)
+    return moves
+
+def format_game(moves: Iterable[int], headers: dict[str, str] = None, start_fen: str = START_FEN,
+                result: str = '*') -> str:
+    '''Returns the PGN text of a game given as encoded moves from start_fen, with the seven tag roster first'''
+    headers = dict(headers or {})
+    headers['Result'] = result
+    if start_fen != START_FEN:
+        headers.setdefault('SetUp', '1')
+        headers['FEN'] = start_fen
+    tags: list[str] = list(SEVEN_TAG_ROSTER) + [tag for tag in headers if tag not in SEVEN_TAG_ROSTER]
+    lines: list[str] = []
+    for tag in tags:
+        value: str = headers.get(tag, '?')
+        escaped: str = value.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(f'[{tag} "{escaped}"]')
+    lines.append('')
+    board: Board = Board(views=False)
+    board.fen_to_board(start_fen, views=False)
+    tokens: list[str] = []
+    for move in moves:
+        if board.side == WHITE:
+            tokens.append(f'{board.full_move_counter}.')
+        elif not tokens:
+            tokens.append(f'{board.full_move_counter}...')
+        tokens.append(move_to_san(board, move))
+        board.make_move(move)
+    tokens.append(result)
+    line: str = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+def game_result(board: Board) -> str:
+    '''Returns the result tag of a position: decided when the side to move has no legal moves,
+    drawn by repetition, the fifty-move rule or insufficient material, otherwise *'''
+    if generate_legal_moves(board):
+        return '1/2-1/2' if board.draw_reason() else '*'
+    if not _in_check(board):
+        return '1/2-1/2'
+    return '0-1' if board.side == WHITE else '1-0'
+
+def write_game(out: TextIO, game: Game, headers: dict[str, str] = None) -> None:
+    '''Writes the moves played so far in a Game as PGN'''
+    out.write(format_game(game.moves, headers, game.start_fen, game_result(game.board)))
+
+def benchmark(path: str, replay_moves: bool = True, out: TextIO = sys.stdout) -> tuple[int, float]:
+    '''Parses every game of a file, replaying the moves unless replay_moves is False, and prints games per second
+    Returns the number of games with the elapsed seconds'''
+    board: Board = Board(views=False)
+    games: int = 0
+    plies: int = 0
+    errors: int = 0
+    start: float = time.perf_counter()
+    with open(path, encoding='utf-8', errors='replace') as lines:
+        for game in read_games(lines):
+            games += 1
+            plies += len(game.moves)
+            if replay_moves:
+                try:
+                    replay(game, board)
+                except ValueError as error:
+                    errors += 1
+                    print(f'game {games}: {error}', file=out)
+    elapsed: float = time.perf_counter() - start
+    print(f'{games} games, {plies} plies, {errors} errors in {elapsed:.3f}s  '
+          f'{games / elapsed if elapsed else 0:.1f} games/s  {plies / elapsed if elapsed else 0:.0f} plies/s', file=out)
+    return games, elapsed
+
+def main(argv: list[str] = None) -> int:
+    '''Parses the command line and runs the throughput benchmark'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='PGN parse and replay benchmark')
+    parser.add_argument('path', help='PGN file to read')
+    parser.add_argument('--parse-only', action='store_true', help='only parse the games, without replaying the moves')
+    args: argparse.Namespace = parser.parse_args(argv)
+    benchmark(args.path, not args.parse_only)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
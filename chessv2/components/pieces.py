@@ -1,52 +1,66 @@
 '''This module stores the logic for the pieces'''
 from __future__ import annotations
 from abc import ABCMeta, abstractmethod
-from copy import deepcopy
-from typing import Literal
-import pygame
-from .constants import *
+from typing import Final, TYPE_CHECKING
+from .constants import SQUARE_SIZE
+from .bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+if TYPE_CHECKING:
+    import pygame
+
+# Valid moves of every piece whose moves are not cached, shared instead of an empty list per piece
+NO_MOVES: Final[tuple] = ()
+# Released pieces kept per piece code for reuse, as many as one side can have of a piece type
+POOL_LIMIT: Final[int] = 10
 
 class Piece(metaclass = ABCMeta):
-    '''Initializes each piece with a board position and color'''
+    '''Initializes each piece with a board position and color
+    Pieces are only views of the board's piece codes for drawing and selection, so they hold nothing but their
+    square, their color and the moves cached for the selected piece, the pixel position is derived on demand'''
     # this is how we define slots in python
-    __slots__ = ['board_pos', 'color', 'x_pos', 'y_pos', 'valid_moves']
+    __slots__ = ('board_pos', 'color', 'valid_moves')
     board_pos: int
     color: str
-    x_pos: int
-    y_pos: int
-    valid_moves: list[int]
-    attack_moves: list[int]
+    valid_moves: list[int] | tuple
+    # the piece type used in the compact piece code, set by each subclass
+    kind: int
     def __init__(self, board_pos: int, color: str) -> None:
         '''Initializes variables each piece will need'''
-        self.board_pos: int = board_pos
         self.color: str = color
-        self.x_pos: int = 0
-        self.y_pos: int = 0
-        self.calc_pos()
-        self.valid_moves: list[int] = []
-        self.attack_moves: list[int] = []
+        self.reset(board_pos)
+
+    def reset(self, board_pos: int) -> None:
+        '''Places the piece on a square with no cached moves, also used when the pool hands it out again'''
+        self.board_pos: int = board_pos
+        # shared empty tuple until the board caches the moves of the selected piece
+        self.valid_moves: list[int] | tuple = NO_MOVES
 
-    def calc_pos(self) -> None:
-        '''Calculates the x and y position of the piece'''
-        self.x_pos = (self.board_pos % 8) * SQUARE_SIZE
-        self.y_pos = (self.board_pos // 8) * SQUARE_SIZE
+    @property
+    def code(self) -> int:
+        '''Returns the compact piece code used by the bitboards'''
+        return (BLACK if self.color == 'black' else WHITE) << 3 | self.kind
+
+    @property
+    def x_pos(self) -> int:
+        '''Returns the x pixel of the piece's square'''
+        return self.board_pos % 8 * SQUARE_SIZE
+
+    @property
+    def y_pos(self) -> int:
+        '''Returns the y pixel of the piece's square'''
+        return self.board_pos // 8 * SQUARE_SIZE
 
     def move(self, board_pos) -> None:
-        '''When a piece is moved this method updates the board position and recalculates x and y'''
+        '''When a piece is moved this method updates the board position'''
         self.board_pos = board_pos
-        self.calc_pos()
 
     def clear_moves(self) -> None:
-        '''This method clears the valid moves list'''
-        self.valid_moves.clear()
-
-    @abstractmethod
-    def get_valid_moves(self, board: object) -> None:
-        '''Calculates the valid moves for the piece'''
+        '''This method drops the cached valid moves'''
+        self.valid_moves = NO_MOVES
 
-    @abstractmethod
     def draw(self, win: pygame.Surface) -> None:
-        '''Draws the piece on the board'''
+        '''Draws the piece on the board, the sprite is loaded on first use'''
+        from .sprites import get_sprite
+        win.blit(get_sprite(self.piece_to_fen()), (self.x_pos, self.y_pos))
 
     @abstractmethod
     def piece_to_fen(self) -> str:
@@ -58,304 +72,63 @@ class King(Piece):
     # dictionarys are created for all objects in python the values in the dictionary
     # are the values of the variables and takes up a lot of memory by creating a dictionary
     # only changes how python would retrieve the data
-    __slots__ = ('check', 'queen_side', 'king_side')
-    check: bool
-    queen_side: bool
-    king_side: bool
-    '''Check sees if the king is in check'''
-    def __init__(self, board_pos: int, color: str) -> None:
-        '''King has check, queen side, and king side attributes'''
-        super().__init__(board_pos, color)
-        self.check: bool = False
-        self.queen_side: bool = True
-        self.king_side: bool = True
-
-    def get_valid_moves(self, board: object) -> list:
-        offset: list = [-9, -8, -7, -1, 1, 7, 8, 9]
-        for move in offset:
-            if self.board_pos + move >= 0 and self.board_pos + move <= 63 and \
-                    abs(self.board_pos % 8 - (self.board_pos + move) % 8) <= 1:
-                if board.board[self.board_pos + move] != 0 and board.board[self.board_pos + move].color != self.color:
-                    self.valid_moves.append(self.board_pos + move)
-                    self.attack_moves.append(self.board_pos + move)
-                if board.board[self.board_pos + move] == 0:
-                    self.valid_moves.append(self.board_pos + move)
-                    self.attack_moves.append(self.board_pos + move)
-        return self.valid_moves
-
-    def draw(self, win: pygame.Surface) -> None:
-        if self.color == 'white':
-            win.blit(WKING, (self.x_pos, self.y_pos))
-        else:
-            win.blit(BKING, (self.x_pos, self.y_pos))
-
-    # def in_check(self) -> bool:
-    #     '''This function checks to see if the king is in check'''
-    #     return False
-
+    __slots__ = ()
+    kind = KING
     def piece_to_fen(self) -> str:
         return 'k' if self.color == 'black' else 'K'
 
 class Pawn(Piece):
     '''Holds the logic for the pawn'''
-    __slots__ = ('en_passant', 'en_passant_pos', 'attack_moves')
-    en_passant: bool
-    en_passant_pos: int
-    attack_moves: list[int]
-    def __init__(self, board_pos: int, color: str) -> None:
-        '''Pawn has en passant and en passant position attributes'''
-        super().__init__(board_pos, color)
-        self.en_passant: bool = False
-        self.en_passant_pos: int = None
-
-    def get_valid_moves(self, board: object) -> list:
-        '''Calculates the valid moves for the pawn'''
-        direction: int = -1 if self.color == 'white' else 1
-        if self.y_pos == 100 and self.color == 'black' or (self.y_pos == 600 and self.color == 'white'):
-            if board.board[self.board_pos + (16 * direction)] == 0\
-                and board.board[self.board_pos + (8 * direction)] == 0:
-                self.valid_moves.append(self.board_pos + (16 * direction))
-        if board.board[self.board_pos + (8 * direction)] == 0:
-            self.valid_moves.append(self.board_pos + (8 * direction))
-        if self.board_pos % 8 == 0:
-            if self.color == 'white':
-                if board.board[self.board_pos - 7] != 0 and board.board[self.board_pos - 7].color != self.color:
-                    self.valid_moves.append(self.board_pos - 7)
-                    self.attack_moves.append(self.board_pos - 7)
-            else:
-                if board.board[self.board_pos + 9] != 0 and board.board[self.board_pos + 9].color != self.color:
-                    self.valid_moves.append(self.board_pos + 9)
-                    self.attack_moves.append(self.board_pos + 9)
-        elif self.board_pos % 8 == 7:
-            if self.color == 'white':
-                if  board.board[self.board_pos - 9] != 0 and board.board[self.board_pos - 9].color != self.color:
-                    self.valid_moves.append(self.board_pos - 9)
-                    self.attack_moves.append(self.board_pos - 9)
-            else:
-                if board.board[self.board_pos + 7] != 0 and board.board[self.board_pos + 7].color != self.color:
-                    self.valid_moves.append(self.board_pos + 7)
-                    self.attack_moves.append(self.board_pos + 7)
-        else:
-            if board.board[self.board_pos + 7 * direction] != 0 and board.board[self.board_pos + 7 * direction].color != self.color:
-                self.valid_moves.append(self.board_pos + 7 * direction)
-                self.attack_moves.append(self.board_pos + 7 * direction)
-            if board.board[self.board_pos + 9 * direction] != 0 and board.board[self.board_pos + 9 * direction].color != self.color:
-                self.valid_moves.append(self.board_pos + 9 * direction)
-                self.attack_moves.append(self.board_pos + 9 * direction)
-        if board.en_passant != -1:
-            print(board.en_passant)
-            if self.color == 'white':
-                temp = self.board_pos - 9
-                if self.board_pos - board.en_passant == -1:
-                    self.valid_moves.append(self.board_pos - 7)
-                else:
-                    if self.board_pos - board.en_passant == 1 and temp % 8 != 7:
-                        self.valid_moves.append(self.board_pos - 9)
-            else:
-                if self.board_pos - board.en_passant == 1:
-                    self.valid_moves.append(self.board_pos + 7)
-                else:
-                    temp = self.board_pos + 9
-                    if self.board_pos - board.en_passant == -1 and temp % 8 != 0:
-                        self.valid_moves.append(self.board_pos + 9)
-        return self.valid_moves
-
-    def draw(self, win: pygame.Surface) -> None:
-        if self.color == 'white':
-            win.blit(WPAWN, (self.x_pos, self.y_pos))
-        else:
-            win.blit(BPAWN, (self.x_pos, self.y_pos))
-
+    __slots__ = ()
+    kind = PAWN
     def piece_to_fen(self) -> str:
         return 'p' if self.color == 'black' else 'P'
 
 class Knight(Piece):
     '''Holds the logic for the knight'''
     __slots__ = ()
-    def get_valid_moves(self, board: object) -> list:
-        offsets: list = [17, 15, -17, -15, 10, -10, 6, -6]
-        col: int = self.board_pos % 8
-        for offset in offsets:
-            distance: int = (self.board_pos + offset) % 8 - col
-            if self.board_pos + offset >= 0 and self.board_pos + offset < 64 and abs(distance) < 3:
-                if board.board[self.board_pos + offset] == 0 or board.board[self.board_pos + offset].color != self.color:
-                    self.valid_moves.append(self.board_pos + offset)
-                    self.attack_moves.append(self.board_pos + offset)
-        return self.valid_moves
-
-    def draw(self, win: pygame.Surface) -> None:
-        if self.color == 'white':
-            win.blit(WKNIGHT, (self.x_pos, self.y_pos))
-        else:
-            win.blit(BKNIGHT, (self.x_pos, self.y_pos))
-    
+    kind = KNIGHT
     def piece_to_fen(self) -> str:
         return 'n' if self.color == 'black' else 'N'
 
 class Bishop(Piece):
     '''Holds the logic for the bishop'''
     __slots__ = ()
-    def get_valid_moves(self, board: object) -> list:
-        temp: int = self.board_pos + 9
-        while temp % 8 <= 7 and temp % 8 > self.board_pos % 8 and temp <= 63:
-            if board.board[temp] != 0:
-                if board.board[temp] != 0 and board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp += 9
-        temp = self.board_pos - 9
-        while temp % 8 >= 0 and temp % 8 < self.board_pos % 8 and temp >= 0:
-            if board.board[temp] != 0:
-                if board.board[temp] != 0 and board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp -= 9
-        temp  = self.board_pos - 7
-        while temp % 8 <= 7 and temp % 8 > self.board_pos % 8 and temp >= 0:
-            if board.board[temp] != 0:
-                if board.board[temp] != 0 and board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp -= 7
-        temp = self.board_pos + 7
-        while temp % 8 >= 0 and temp % 8 < self.board_pos % 8 and temp <= 63:
-            if board.board[temp] != 0:
-                if board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp += 7
-        self.attack_moves.extend(self.valid_moves)
-        return self.valid_moves
-
-    def draw(self, win: pygame.Surface) -> None:
-        if self.color == 'white':
-            win.blit(WBISHOP, (self.x_pos, self.y_pos))
-        else:
-            win.blit(BBISHOP, (self.x_pos, self.y_pos))
-
+    kind = BISHOP
     def piece_to_fen(self) -> str:
         return 'b' if self.color == 'black' else 'B'
 
 class Rook(Piece):
     '''Holds the logic for the rook'''
-    __slots__ = ('queen_side', 'king_side', 'moved')
-    queen_side: bool
-    king_side: bool
-    moved: bool
-    def __init__(self, board_pos: int, color: str) -> None:
-        '''The rook holds properties deteriming if it has moved or not'''
-        super().__init__(board_pos, color)
-        self.queen_side: bool = True
-        self.king_side: bool = True
-        self.moved: bool = False
-    def get_valid_moves(self, board: object) -> None:
-        '''Handels the logic for the rook'''
-        temp: int = self.board_pos + 1
-        # right move
-        while temp % 8 <= 7 and temp % 8 > self.board_pos % 8:
-            if board.board[temp] != 0:
-                if board.board[temp] != 0 and board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp += 1
-        temp = self.board_pos - 1
-        # left move
-        while temp % 8 >= 0 and temp % 8 < self.board_pos % 8:
-            if board.board[temp] != 0:
-                if board.board[temp] != 0 and board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp -= 1
-        temp = self.board_pos + 8
-        # up move
-        while temp <= 63:
-            if board.board[temp] != 0:
-                if board.board[temp] != 0 and board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp += 8
-        temp = self.board_pos - 8
-        # down move
-        while temp >= 0:
-            if board.board[temp] != 0:
-                if board.board[temp] != 0 and board.board[temp].color == self.color:
-                    break
-                self.valid_moves.append(temp)
-                break
-            self.valid_moves.append(temp)
-            temp -= 8
-        self.moved = True
-        self.queen_side = False
-        self.king_side = False
-        self.attack_moves.extend(self.valid_moves)
-        return self.valid_moves
-
-    def draw(self, win: pygame.Surface) -> None:
-        if self.color == 'white':
-            win.blit(WROOK, (self.x_pos, self.y_pos))
-        else:
-            win.blit(BROOK, (self.x_pos, self.y_pos))
-      
+    __slots__ = ()
+    kind = ROOK
     def piece_to_fen(self) -> str:
         return 'r' if self.color == 'black' else 'R'
         
 class Queen(Piece):
     '''Holds the logic for the queen'''
     __slots__ = ()
-    def get_valid_moves(self, board: object) -> None:
-        '''Uses the rook and bishop logic to generate moves'''
-        new_bishop: Bishop = Bishop(self.board_pos, self.color)
-        self.valid_moves.extend(new_bishop.get_valid_moves(board))
-        del new_bishop
-        new_rook: Rook = Rook(self.board_pos, self.color)
-        self.valid_moves.extend(new_rook.get_valid_moves(board))
-        del new_rook
-        self.attack_moves.extend(self.valid_moves)
-        return self.valid_moves
-    
-    def draw(self, win: pygame.Surface) -> None:
-        if self.color == 'white':
-            win.blit(WQUEEN, (self.x_pos, self.y_pos))
-        else:
-            win.blit(BQUEEN, (self.x_pos, self.y_pos))
-            
+    kind = QUEEN
     def piece_to_fen(self) -> str:
         return 'q' if self.color == 'black' else 'Q'
 
-# goal: take a square on a board and look at its diagonals, horizontal, and vertical to see if a bishop, rook, etc has vision of the square
-# class Checker():
-#     '''This class is going to be used to see if a square on the board is in check
-#     Used for checkmate and castling'''
-#     __slots__ = ('board_obj', 'board_pos', 'color')
-#     board_obj: object
-#     board_pos: int
-#     color: str
-#     def __init__(self, board_obj: object, color: str, board_pos: int) -> None:
-#         self.board_obj: object = board_obj
-#         self.board_pos: int = board_pos
-#         self.color: str = color
-    
-#     def check(self) -> bool:
-#         '''Checks if a square is in check'''
-#         opp_color: str = 'white' if self.color == 'black' else 'black'
-#         new_bishop: Bishop = Bishop(self.board_pos, self.color)
-#         new_rook: Rook = Rook(self.board_pos, self.color)
-#         new_knight: Knight = Knight(self.board_pos, self.color)
-#         for moves in new_bishop.get_valid_moves(self.board_obj):
-#             spot_piece: Piece | Literal[0] = self.board_obj.board[moves]
-#             if spot_piece != 0 and spot_piece.color != self.color and (isinstance(spot_piece, (Bishop, Queen))):
-#                 return True
\ No newline at end of file
+# Piece class for each piece type
+PIECE_CLASSES: Final[tuple] = (None, Pawn, Knight, Bishop, Rook, Queen, King)
+# Released pieces by piece code, handed out again by take_piece before any new piece is allocated
+_pool: list[list[Piece]] = [[] for _ in range(16)]
+
+def take_piece(code: int, board_pos: int) -> Piece:
+    '''Returns a piece of the given piece code on a square, reusing a released one when there is one'''
+    pooled: list[Piece] = _pool[code]
+    if pooled:
+        piece: Piece = pooled.pop()
+        piece.reset(board_pos)
+        return piece
+    return PIECE_CLASSES[code & 7](board_pos, 'black' if code >> 3 else 'white')
+
+def release_piece(piece: Piece) -> None:
+    '''Hands a piece that left the board back to the pool, it must not be used again by the caller'''
+    pooled: list[Piece] = _pool[piece.code]
+    if len(pooled) < POOL_LIMIT:
+        piece.valid_moves = NO_MOVES
+        pooled.append(piece)
@@ -0,0 +1,65 @@
+'''This module redraws only the parts of the window that changed since the last frame'''
+from __future__ import annotations
+from typing import Iterable
+import pygame
+from .constants import SQUARE_SIZE
+from .metrics import RENDER_FRAME, timed
+
+# Color of the dots marking the valid moves of the selected piece
+MOVE_DOT: tuple = (15, 10, 75)
+
+class Renderer:
+    '''Tracks dirty squares by comparing the board and the shown valid moves with what was drawn last frame'''
+    __slots__ = ('win', 'drawn_squares', 'drawn_moves', 'dirty', 'full_redraw')
+    win: pygame.Surface
+    drawn_squares: bytes
+    drawn_moves: frozenset
+    dirty: set
+    full_redraw: bool
+    def __init__(self, win: pygame.Surface) -> None:
+        '''The first frame always draws the whole window'''
+        self.win: pygame.Surface = win
+        self.drawn_squares: bytes = b''
+        self.drawn_moves: frozenset = frozenset()
+        self.dirty: set = set()
+        self.full_redraw: bool = True
+
+    def invalidate(self, squares: Iterable[int] = None) -> None:
+        '''Marks squares dirty, or the whole window when none are given, e.g. after the window is exposed'''
+        if squares is None:
+            self.full_redraw = True
+        else:
+            self.dirty.update(squares)
+
+    @timed(RENDER_FRAME)
+    def render(self, board: object, valid_moves: Iterable[int]) -> bool:
+        '''Redraws the changed squares and pushes only their rects to the display
+        Returns False without touching the display when nothing changed'''
+        moves: frozenset = frozenset(valid_moves)
+        squares: bytes = bytes(board.squares)
+        if self.full_redraw:
+            board.draw_squares(self.win)
+            self._draw_moves(moves)
+            pygame.display.update()
+        else:
+            dirty: set = self.dirty
+            if squares != self.drawn_squares:
+                dirty.update(pos for pos in range(64) if squares[pos] != self.drawn_squares[pos])
+            dirty.update(moves ^ self.drawn_moves)
+            if not dirty:
+                return False
+            board.draw_squares(self.win, dirty)
+            self._draw_moves(moves & dirty)
+            pygame.display.update([pygame.Rect(pos % 8 * SQUARE_SIZE, pos // 8 * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                                   for pos in dirty])
+        self.drawn_squares = squares
+        self.drawn_moves = moves
+        self.dirty = set()
+        self.full_redraw = False
+        return True
+
+    def _draw_moves(self, moves: Iterable[int]) -> None:
+        '''Draws a dot on each valid move square'''
+        for move in moves:
+            pygame.draw.circle(self.win, MOVE_DOT, (move % 8 * SQUARE_SIZE + SQUARE_SIZE // 2,
+                                                    move // 8 * SQUARE_SIZE + SQUARE_SIZE // 2), SQUARE_SIZE // 5)
@@ -0,0 +1,265 @@
+'''This module picks moves with a negamax alpha beta search using iterative deepening'''
+from __future__ import annotations
+import time
+from typing import Callable, Final, NamedTuple, TYPE_CHECKING
+from .bitboard import BOTH, CAPTURE, PROMOTION, KING, generate_legal_moves, is_square_attacked
+from .board import FIFTY_MOVE_PLIES
+from .evaluation import evaluate
+from .metrics import METRICS, CHECKS, timed
+from .transposition import TranspositionTable, EXACT, LOWER, UPPER
+if TYPE_CHECKING:
+    from .tablebase import Tablebase
+
+INFINITY: Final[int] = 1_000_000
+MATE: Final[int] = 100_000
+MAX_PLY: Final[int] = 64
+# Scores beyond this are mates, the distance to mate is MATE minus the score
+MATE_BOUND: Final[int] = MATE - MAX_PLY
+# Mask of the node counter between two checks of the clock and node budget
+CHECK_MASK: Final[int] = 255
+# Piece weights for most valuable victim, least valuable attacker ordering, indexed by piece type
+_ORDER_VALUES: Final[tuple] = (0, 1, 3, 3, 5, 9, 20)
+_CAPTURE_ORDER: Final[int] = 1 << 24
+_KILLER_ORDER: Final[int] = 1 << 22
+
+class SearchResult(NamedTuple):
+    '''Outcome of a search, move is 0 when the side to move has no legal moves'''
+    move: int
+    score: int
+    depth: int
+    nodes: int
+    elapsed: float
+
+class SearchTimeout(Exception):
+    '''Raised inside the search once the time or node budget runs out'''
+
+class Search:
+    '''Negamax alpha beta search over a Board, using make_move and unmake_move so the board is never copied'''
+    __slots__ = ('board', 'table', 'tablebase', 'killers', 'history', 'nodes', 'node_limit', 'deadline', 'stopped',
+                 'stop_check')
+    board: object
+    table: TranspositionTable
+    tablebase: Tablebase
+    killers: list
+    history: list[int]
+    nodes: int
+    node_limit: int
+    deadline: float
+    stopped: bool
+    stop_check: Callable[[], bool]
+    def __init__(self, board: object, table: TranspositionTable = None, tablebase: Tablebase = None) -> None:
+        '''Killer moves are kept per ply and history scores per from and to square
+        Pass a table to share results between searches, otherwise a default sized one is made,
+        and a tablebase to score positions with three pieces or fewer exactly'''
+        self.board: object = board
+        self.table: TranspositionTable = table if table is not None else TranspositionTable()
+        self.tablebase: Tablebase = tablebase
+        self.killers: list = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history: list[int] = [0] * 4096
+        self.nodes: int = 0
+        self.node_limit: int = 0
+        self.deadline: float = 0.0
+        self.stopped: bool = False
+        self.stop_check: Callable[[], bool] = None
+
+    def stop(self) -> None:
+        '''Asks a running search to return its best move so far, safe to call from another thread'''
+        self.stopped = True
+
+    @timed()
+    def search(self, max_depth: int = MAX_PLY, time_limit: float = None, node_limit: int = None,
+               callback: Callable[[SearchResult], None] = None,
+               stop_check: Callable[[], bool] = None, root_moves: list[int] = None) -> SearchResult:
+        '''Deepens one ply at a time until max_depth, the time limit in seconds or the node limit is reached
+        The callback receives the result of every completed iteration, stop_check is polled with the clock
+        and ends the search early when it returns True
+        root_moves restricts the root to those legal moves, as when the root is split between processes'''
+        start: float = time.perf_counter()
+        self.stop_check = stop_check
+        self.deadline = start + time_limit if time_limit else float('inf')
+        self.node_limit = node_limit or 0
+        self.nodes = 0
+        self.stopped = False
+        self.table.new_search()
+        for index, score in enumerate(self.history):
+            self.history[index] = score >> 3
+        board: object = self.board
+        # the board is back in the same position afterwards, so a tracked attack map is left out of the search
+        attack_map: object = board.attack_map
+        board.attack_map = None
+        try:
+            moves: list[int] = generate_legal_moves(board)
+            if root_moves is not None:
+                moves = [move for move in moves if move in root_moves]
+            if not moves:
+                return SearchResult(0, -MATE if self._in_check() else 0, 0, 0, time.perf_counter() - start)
+            result: SearchResult = SearchResult(moves[0], 0, 0, 0, 0.0)
+            entry: tuple = self.table.probe(board.zobrist_key)
+            self.order_root_moves(moves, entry[0] if entry else 0)
+            for depth in range(1, max_depth + 1):
+                try:
+                    score, move = self._root(moves, depth)
+                except SearchTimeout:
+                    break
+                elapsed: float = time.perf_counter() - start
+                result = SearchResult(move, score, depth, self.nodes, elapsed)
+                if callback is not None:
+                    callback(result)
+                moves.remove(move)
+                moves.insert(0, move)
+                # another iteration costs several times this one, so stop early rather than overrun the limit
+                if abs(score) >= MATE_BOUND or len(moves) == 1 and root_moves is None \
+                        or time_limit and elapsed > time_limit / 2:
+                    break
+            return result._replace(nodes=self.nodes, elapsed=time.perf_counter() - start)
+        finally:
+            board.attack_map = attack_map
+
+    def _root(self, moves: list[int], depth: int) -> tuple[int, int]:
+        '''Searches every root move and returns the best score with its move'''
+        board: object = self.board
+        alpha: int = -INFINITY
+        best_move: int = moves[0]
+        for move in moves:
+            board.make_move(move)
+            try:
+                score: int = -self._negamax(depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                board.unmake_move(move)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.table.store(board.zobrist_key, best_move, depth, EXACT, alpha)
+        return alpha, best_move
+
+    def _check_budget(self) -> None:
+        '''Raises SearchTimeout when the search was stopped or ran out of time or nodes'''
+        if self.stopped or time.perf_counter() >= self.deadline or self.node_limit and self.nodes >= self.node_limit \
+                or self.stop_check is not None and self.stop_check():
+            raise SearchTimeout()
+
+    def _in_check(self) -> bool:
+        '''Returns True if the side to move is in check'''
+        if METRICS.enabled:
+            METRICS.count(CHECKS)
+        board: object = self.board
+        king: int = board.bitboards[board.side << 3 | KING]
+        return bool(king) and is_square_attacked(board, king.bit_length() - 1, board.side ^ 1)
+
+    def _negamax(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        '''Returns the score of the position for the side to move within the alpha beta window'''
+        self.nodes += 1
+        if not self.nodes & CHECK_MASK:
+            self._check_budget()
+        board: object = self.board
+        # a position met before on the path or in the game is scored as the draw repeating it would force
+        if ply and (board.repetitions[board.zobrist_key] > 1 or board.half_move_counter >= FIFTY_MOVE_PLIES):
+            return 0
+        in_check: bool = self._in_check()
+        if in_check:
+            depth += 1
+        if self.tablebase is not None and board.occupancy[BOTH].bit_count() <= 3:
+            score: int = self.tablebase.probe_score(board, ply)
+            if score is not None:
+                return score
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(alpha, beta, ply)
+        key: int = board.zobrist_key
+        entry: tuple = self.table.probe(key)
+        table_move: int = 0
+        if entry is not None:
+            table_move, table_depth, bound, score = entry
+            if table_depth >= depth:
+                # mate scores are stored relative to the node, so move them back to the root
+                if score >= MATE_BOUND:
+                    score -= ply
+                elif score <= -MATE_BOUND:
+                    score += ply
+                if bound == EXACT or bound == LOWER and score >= beta or bound == UPPER and score <= alpha:
+                    return score
+        moves: list[int] = generate_legal_moves(board)
+        if not moves:
+            return -MATE + ply if in_check else 0
+        self._order(moves, ply, table_move)
+        original_alpha: int = alpha
+        best: int = -INFINITY
+        best_move: int = 0
+        for move in moves:
+            board.make_move(move)
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move(move)
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not move >> 12 & (CAPTURE | PROMOTION):
+                            self._store_quiet(move, depth, ply)
+                        break
+        bound = LOWER if best >= beta else UPPER if best <= original_alpha else EXACT
+        stored: int = best + ply if best >= MATE_BOUND else best - ply if best <= -MATE_BOUND else best
+        self.table.store(key, best_move, depth, bound, stored)
+        return best
+
+    def _quiescence(self, alpha: int, beta: int, ply: int) -> int:
+        '''Searches captures and promotions only, so the static evaluation is never taken mid exchange'''
+        self.nodes += 1
+        if not self.nodes & CHECK_MASK:
+            self._check_budget()
+        board: object = self.board
+        stand_pat: int = evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        moves: list[int] = [move for move in generate_legal_moves(board) if move >> 12 & (CAPTURE | PROMOTION)]
+        self._order(moves, ply)
+        for move in moves:
+            board.make_move(move)
+            try:
+                score: int = -self._quiescence(-beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move(move)
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+    def _store_quiet(self, move: int, depth: int, ply: int) -> None:
+        '''Remembers a quiet move that caused a cutoff as a killer and in the history table'''
+        killers: list[int] = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move & 4095] += depth * depth
+
+    def order_root_moves(self, moves: list[int], first: int = 0) -> None:
+        '''Sorts the legal moves of the board's position best first, first being searched before the rest
+        Also used by ParallelSearch to split the root moves between its workers'''
+        self._order(moves, 0, first)
+
+    def _order(self, moves: list[int], ply: int, first: int = 0) -> None:
+        '''Sorts moves best first: the given move, captures by MVV-LVA and promotions, killers, then history'''
+        squares: bytearray = self.board.squares
+        killers: list[int] = self.killers[ply]
+        history: list[int] = self.history
+        def order_key(move: int) -> int:
+            if move == first:
+                return _CAPTURE_ORDER << 2
+            flag: int = move >> 12
+            if flag & (CAPTURE | PROMOTION):
+                # en passant lands on an empty square, so a missing victim is a pawn
+                victim: int = squares[move >> 6 & 63] & 7 or 1
+                promotion: int = 10 * (flag & 3) if flag & PROMOTION else 0
+                return _CAPTURE_ORDER + promotion + 10 * _ORDER_VALUES[victim if flag & CAPTURE else 0] \
+                    - _ORDER_VALUES[squares[move & 63] & 7]
+            if move == killers[0]:
+                return _KILLER_ORDER + 1
+            if move == killers[1]:
+                return _KILLER_ORDER
+            return history[move & 4095]
+        moves.sort(key=order_key, reverse=True)
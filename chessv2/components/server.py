@@ -0,0 +1,417 @@
+'''This module hosts many games at once behind an asyncio server, without pygame
+Clients send one JSON object per line and get one back, over TCP, a unix socket or an in process stand in.
+Engine replies are searched in a process pool so the event loop keeps serving every other session.
+Run the load benchmark from the repository root with: python -m chessv2.components.server --help'''
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import socket
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Final
+from .board import Board
+from .bitboard import WHITE, BLACK, generate_legal_moves, move_to_uci
+from .metrics import METRICS, configure_logging
+from .parallel import WorkerState, worker_pool, worker_state
+from .perft import START_FEN
+from .pgn import game_result
+from .search import Search, SearchResult, MAX_PLY
+
+# Search depth and seconds of the engine replies unless a session asks otherwise
+ENGINE_DEPTH: Final[int] = 3
+ENGINE_TIME: Final[float] = 1.0
+# Most seconds a session may give the engine per reply, so no client can hold a worker for long
+MAX_ENGINE_TIME: Final[float] = 10.0
+# Longest request line accepted, in bytes
+MAX_LINE: Final[int] = 1 << 16
+_COLORS: Final[dict] = {'white': WHITE, 'black': BLACK}
+# Requests that act on an existing session
+_SESSION_OPS: Final[frozenset] = frozenset(('move', 'legal', 'state', 'close'))
+
+_logger: Final[logging.Logger] = logging.getLogger(__name__)
+
+class ProtocolError(Exception):
+    '''Raised for a request the server cannot act on, its message is sent back to the client'''
+
+def _text_field(request: dict, field: str, default: str = None) -> str:
+    '''Returns a string field of a request, raising ProtocolError when the client sent anything else'''
+    value: object = request.get(field, default)
+    if value is not None and not isinstance(value, str):
+        raise ProtocolError(f'{field} must be a string')
+    return value
+
+def _depth_field(request: dict) -> int:
+    '''Returns the engine depth of a request, raising ProtocolError unless it is an integer from 1 to MAX_PLY'''
+    depth: object = request.get('depth', ENGINE_DEPTH)
+    if isinstance(depth, bool) or not isinstance(depth, int) or not 1 <= depth <= MAX_PLY:
+        raise ProtocolError(f'depth must be an integer from 1 to {MAX_PLY}')
+    return depth
+
+def _time_field(request: dict) -> float:
+    '''Returns the engine seconds of a request, raising ProtocolError unless it is a finite number above 0
+    and at most MAX_ENGINE_TIME'''
+    seconds: object = request.get('time', ENGINE_TIME)
+    if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or not math.isfinite(seconds) \
+            or not 0 < seconds <= MAX_ENGINE_TIME:
+        raise ProtocolError(f'time must be a number of seconds above 0 and at most {MAX_ENGINE_TIME}')
+    return float(seconds)
+
+def _engine_move(fen: str, depth: int, time_limit: float) -> int:
+    '''Searches a position in an engine worker and returns the encoded best move'''
+    worker: WorkerState = worker_state()
+    worker.board.fen_to_board(fen, views=False)
+    result: SearchResult = Search(worker.board, worker.table).search(depth, time_limit)
+    return result.move
+
+class Session:
+    '''One game hosted by the server, the board is only ever changed through its legal moves'''
+    __slots__ = ('board', 'ai_side', 'depth', 'time_limit', 'thinking', 'moves')
+    board: Board
+    ai_side: int
+    depth: int
+    time_limit: float
+    thinking: bool
+    moves: int
+    def __init__(self, fen: str = START_FEN, ai_side: int = -1, depth: int = ENGINE_DEPTH,
+                 time_limit: float = ENGINE_TIME) -> None:
+        '''ai_side is the color the engine plays, -1 for a game between two clients'''
+        self.board: Board = Board(views=False)
+        if fen != START_FEN:
+            self.board.fen_to_board(fen, views=False)
+        self.board.track_attacks()
+        self.ai_side: int = ai_side
+        self.depth: int = depth
+        self.time_limit: float = time_limit
+        self.thinking: bool = False
+        self.moves: int = 0
+
+    def state(self) -> dict:
+        '''Returns the position and result sent back after every change, with the reason for a draw'''
+        result: str = game_result(self.board)
+        state: dict = {'fen': self.board.board_to_fen(), 'result': result}
+        if result == '1/2-1/2':
+            state['reason'] = self.board.draw_reason() or 'stalemate'
+        return state
+
+def measure_memory(factory: Callable[[], object], count: int = 100) -> float:
+    '''Returns the bytes an object made by factory holds on average, measured with tracemalloc over count of them'''
+    tracing: bool = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    before: int = tracemalloc.get_traced_memory()[0]
+    made: list = [factory() for _ in range(count)]
+    used: int = tracemalloc.get_traced_memory()[0] - before
+    if not tracing:
+        tracemalloc.stop()
+    del made
+    return used / count
+
+def measure_session_memory(count: int = 100) -> float:
+    '''Returns the bytes a session holds on average'''
+    return measure_memory(Session, count)
+
+class SessionServer:
+    '''Hosts sessions by id and answers requests for them
+    Requests are objects with an op field: new, move, legal, state, close, stats and profile, any id field is
+    echoed back. profile starts the profiler of the server process or stops it and returns its statistics'''
+    __slots__ = ('sessions', 'next_id', 'pool', 'moves', 'started', 'session_bytes', 'servers', 'connections')
+    sessions: dict[int, Session]
+    next_id: int
+    pool: ProcessPoolExecutor
+    moves: int
+    started: float
+    session_bytes: float
+    servers: list
+    connections: set
+    def __init__(self, workers: int = None, table_megabytes: float = 8) -> None:
+        '''Starts the engine pool, workers defaults to the number of cores'''
+        self.sessions: dict[int, Session] = {}
+        self.next_id: int = 1
+        self.pool: ProcessPoolExecutor = worker_pool(workers, table_megabytes)
+        self.moves: int = 0
+        self.started: float = time.perf_counter()
+        self.session_bytes: float = measure_session_memory()
+        self.servers: list = []
+        # tasks serving local connections, the loop only holds weak references to them
+        self.connections: set = set()
+
+    async def handle_line(self, line: str | bytes) -> str:
+        '''Answers one request line with one response line, errors included'''
+        request: dict = {}
+        try:
+            decoded: object = json.loads(line)
+            if not isinstance(decoded, dict):
+                raise ProtocolError('request must be a JSON object')
+            request = decoded
+            response: dict = await self.handle(request)
+        except (ValueError, TypeError, ProtocolError) as error:
+            response = {'ok': False, 'error': str(error)}
+        except Exception:
+            # a bug must cost the client one request, not its connection
+            _logger.exception('request %.200r failed', line)
+            response = {'ok': False, 'error': 'internal error'}
+        if 'id' in request:
+            response['id'] = request['id']
+        return json.dumps(response, separators=(',', ':')) + '\n'
+
+    async def handle(self, request: dict) -> dict:
+        '''Answers a decoded request, raising ProtocolError or ValueError when it cannot be acted on'''
+        op: str = request.get('op')
+        if op == 'new':
+            return await self._new(request)
+        if op == 'stats':
+            return self.stats()
+        if op == 'profile':
+            return self.profile()
+        if op not in _SESSION_OPS:
+            raise ProtocolError(f'unknown op {op!r}')
+        session_id: int = request.get('session')
+        session: Session = self.sessions.get(session_id)
+        if session is None:
+            raise ProtocolError(f'no session {session_id}')
+        if op == 'move':
+            return await self._move(session, _text_field(request, 'move', ''))
+        if op == 'legal':
+            return {'ok': True, 'moves': [move_to_uci(move) for move in generate_legal_moves(session.board)]}
+        if op == 'state':
+            return {'ok': True, **session.state()}
+        del self.sessions[session_id]
+        return {'ok': True}
+
+    def stats(self) -> dict:
+        '''Returns the number of sessions, the moves played and the rate since the server started
+        The counters and timings of the metrics layer are included while it is enabled'''
+        elapsed: float = time.perf_counter() - self.started
+        stats: dict = {'ok': True, 'sessions': len(self.sessions), 'moves': self.moves,
+                       'moves_per_second': round(self.moves / elapsed, 1) if elapsed else 0.0,
+                       'session_bytes': round(self.session_bytes)}
+        if METRICS.enabled:
+            stats['metrics'] = METRICS.snapshot()
+        return stats
+
+    def profile(self) -> dict:
+        '''Starts the profiler, or stops it and returns its statistics when it is running'''
+        if METRICS.profiling:
+            return {'ok': True, 'profiling': False, 'profile': METRICS.stop_profile()}
+        METRICS.start_profile()
+        return {'ok': True, 'profiling': True}
+
+    async def _new(self, request: dict) -> dict:
+        '''Opens a session, from a FEN if given, where the engine may play one side'''
+        ai: str = _text_field(request, 'ai')
+        if ai is not None and ai not in _COLORS:
+            raise ProtocolError(f'ai must be white or black, not {ai!r}')
+        session: Session = Session(_text_field(request, 'fen', START_FEN), _COLORS.get(ai, -1),
+                                   _depth_field(request), _time_field(request))
+        # only registered once the engine's first reply is in, a failed reply must not leave it behind
+        reply: str = await self._engine_reply(session)
+        session_id: int = self.next_id
+        self.next_id += 1
+        self.sessions[session_id] = session
+        response: dict = {'ok': True, 'session': session_id}
+        if reply:
+            response['reply'] = reply
+        response.update(session.state())
+        return response
+
+    async def _move(self, session: Session, text: str) -> dict:
+        '''Plays a client move given in long algebraic notation, then the engine's reply if it plays the other side'''
+        if session.thinking:
+            raise ProtocolError('the engine is thinking')
+        result: str = game_result(session.board)
+        if result != '*':
+            raise ProtocolError(f'the game is over: {result}')
+        if session.board.side == session.ai_side:
+            raise ProtocolError('it is the engine\'s turn')
+        legal: dict[str, int] = {move_to_uci(move): move for move in generate_legal_moves(session.board)}
+        move: int = legal.get(text)
+        if move is None:
+            raise ProtocolError(f'{text!r} is not a legal move')
+        session.board.make_move(move)
+        session.moves += 1
+        self.moves += 1
+        response: dict = {'ok': True}
+        reply: str = await self._engine_reply(session)
+        if reply:
+            response['reply'] = reply
+        response.update(session.state())
+        return response
+
+    async def _engine_reply(self, session: Session) -> str:
+        '''Searches and plays the engine's move in the pool when it is the engine's turn, returning it or ""'''
+        board: Board = session.board
+        if board.side != session.ai_side or game_result(board) != '*':
+            return ''
+        session.thinking = True
+        try:
+            move: int = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _engine_move, board.board_to_fen(), session.depth, session.time_limit)
+        finally:
+            session.thinking = False
+        board.make_move(move)
+        session.moves += 1
+        self.moves += 1
+        return move_to_uci(move)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Answers the requests of one connection in order until it closes'''
+        try:
+            while True:
+                line: bytes = await reader.readline()
+                if not line:
+                    break
+                writer.write((await self.handle_line(line)).encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def listen(self, host: str = '127.0.0.1', port: int = 0, path: str = None) -> asyncio.AbstractServer:
+        '''Starts accepting connections on a TCP port, port 0 picking a free one, or on a unix socket path'''
+        if path is not None:
+            server: asyncio.AbstractServer = await asyncio.start_unix_server(self._serve_client, path, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self._serve_client, host, port, limit=MAX_LINE)
+        self.servers.append(server)
+        return server
+
+    async def connect_local(self) -> StreamClient:
+        '''Returns a client connected through a socket pair, the whole stream protocol without a network'''
+        server_socket, client_socket = socket.socketpair()
+        reader, writer = await asyncio.open_connection(sock=server_socket, limit=MAX_LINE)
+        task: asyncio.Task = asyncio.get_running_loop().create_task(self._serve_client(reader, writer))
+        self.connections.add(task)
+        task.add_done_callback(self.connections.discard)
+        return StreamClient(*await asyncio.open_connection(sock=client_socket, limit=MAX_LINE))
+
+    def close(self) -> None:
+        '''Stops listening and shuts the engine pool down'''
+        for server in self.servers:
+            server.close()
+        for task in self.connections:
+            task.cancel()
+        self.pool.shutdown(cancel_futures=True)
+
+class LocalClient:
+    '''Stand in for a remote client that calls the server in process, through the same JSON lines'''
+    __slots__ = ('server',)
+    server: SessionServer
+    def __init__(self, server: SessionServer) -> None:
+        self.server: SessionServer = server
+
+    async def request(self, op: str, **fields: object) -> dict:
+        '''Sends one request and returns the decoded response'''
+        return json.loads(await self.server.handle_line(json.dumps({'op': op, **fields})))
+
+class StreamClient:
+    '''Client over an asyncio stream, from SessionServer.connect_local or asyncio.open_connection'''
+    __slots__ = ('reader', 'writer')
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+
+    async def request(self, op: str, **fields: object) -> dict:
+        '''Sends one request and waits for its response'''
+        self.writer.write((json.dumps({'op': op, **fields}) + '\n').encode())
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def close(self) -> None:
+        '''Closes the connection'''
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def _play_random(client: LocalClient | StreamClient, moves: int, rng: random.Random, ai: str = None) -> int:
+    '''Plays random legal moves in a new session until it ends or moves run out, returning the moves sent'''
+    session: int = (await client.request('new', ai=ai, depth=1))['session'] if ai else \
+        (await client.request('new'))['session']
+    sent: int = 0
+    for _ in range(moves):
+        legal: list[str] = (await client.request('legal', session=session))['moves']
+        if not legal:
+            break
+        response: dict = await client.request('move', session=session, move=rng.choice(legal))
+        sent += 1
+        if response.get('result', '*') != '*':
+            break
+    return sent
+
+async def run_benchmark(sessions: int, moves: int, streams: bool = False, ai: str = None,
+                        out: object = sys.stdout) -> dict:
+    '''Plays random games in many concurrent sessions and prints the server's stats'''
+    server: SessionServer = SessionServer()
+    rng: random.Random = random.Random(0)
+    clients: list = [await server.connect_local() if streams else LocalClient(server) for _ in range(sessions)]
+    start: float = time.perf_counter()
+    sent: list[int] = await asyncio.gather(*(_play_random(client, moves, rng, ai) for client in clients))
+    elapsed: float = time.perf_counter() - start
+    stats: dict = server.stats()
+    for client in clients:
+        if streams:
+            await client.close()
+    server.close()
+    print(f"{sessions} sessions, {sum(sent)} client moves, {stats['moves']} moves in {elapsed:.3f}s  "
+          f"{stats['moves'] / elapsed if elapsed else 0:.0f} moves/s  {stats['session_bytes']} bytes/session", file=out)
+    return stats
+
+def main(argv: list[str] = None) -> int:
+    '''Parses the command line and serves games or runs the load benchmark'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Headless multi-game server')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port to listen on')
+    parser.add_argument('--unix', help='listen on this unix socket path instead of TCP')
+    parser.add_argument('--bench', type=int, metavar='SESSIONS', help='play random games in this many sessions')
+    parser.add_argument('--moves', type=int, default=40, help='moves per benchmark session')
+    parser.add_argument('--streams', action='store_true', help='benchmark through socket pairs, not in process')
+    parser.add_argument('--ai', choices=tuple(_COLORS), help='let the engine play this side in benchmark sessions')
+    parser.add_argument('--memory', action='store_true', help='print the memory held by each live game and exit')
+    parser.add_argument('--metrics', action='store_true', help='count move generations, checks and moves made')
+    parser.add_argument('--profile', action='store_true', help='profile the server and print the statistics at exit')
+    parser.add_argument('--log-level', default='WARNING', help='lowest level of log records to show, e.g. DEBUG')
+    args: argparse.Namespace = parser.parse_args(argv)
+    configure_logging(args.log_level)
+    METRICS.enable(args.metrics)
+    if args.profile:
+        METRICS.start_profile()
+    try:
+        return _run(args)
+    finally:
+        if METRICS.enabled:
+            print(METRICS.report(), file=sys.stderr)
+        if METRICS.profiling:
+            print(METRICS.stop_profile(), file=sys.stderr)
+
+def _run(args: argparse.Namespace) -> int:
+    '''Runs what the parsed command line asked for'''
+    if args.memory:
+        print(f'{measure_session_memory():.0f} bytes per server session')
+        print(f'{measure_memory(Board):.0f} bytes per drawn board with its pieces')
+        return 0
+    if args.bench:
+        asyncio.run(run_benchmark(args.bench, args.moves, args.streams, args.ai))
+        return 0
+
+    async def serve() -> None:
+        server: SessionServer = SessionServer()
+        listener: asyncio.AbstractServer = await server.listen(args.host, args.port, args.unix)
+        try:
+            await listener.serve_forever()
+        finally:
+            server.close()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
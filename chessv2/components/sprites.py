@@ -0,0 +1,30 @@
+'''This module loads the piece images the first time they are drawn
+It is the only rules side module that imports pygame, so headless code never pays for it
+The board background is rendered here once as well'''
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+from typing import Final
+import pygame
+from .constants import SQUARE_SIZE, ROWS, COLS, DARK, LIGHT
+
+IMAGE_DIR: Final[Path] = Path(__file__).resolve().parent / 'images'
+# Image file stem for each fen character
+_IMAGE_NAMES: Final[dict] = {'K': 'wKing', 'Q': 'wQueen', 'R': 'wRook', 'B': 'wBishop', 'N': 'wKnight', 'P': 'wPawn',
+                             'k': 'bKing', 'q': 'bQueen', 'r': 'bRook', 'b': 'bBishop', 'n': 'bKnight', 'p': 'bPawn'}
+
+@lru_cache(maxsize=None)
+def get_sprite(fen_char: str) -> pygame.Surface:
+    '''Returns the scaled image for a fen piece character, loading it on first use'''
+    image: pygame.Surface = pygame.image.load(str(IMAGE_DIR / f'{_IMAGE_NAMES[fen_char]}.png'))
+    return pygame.transform.scale(image, (SQUARE_SIZE, SQUARE_SIZE))
+
+@lru_cache(maxsize=None)
+def get_background() -> pygame.Surface:
+    '''Returns the empty checkered board, rendered once and reused for every redraw'''
+    background: pygame.Surface = pygame.Surface((COLS * SQUARE_SIZE, ROWS * SQUARE_SIZE))
+    background.fill(DARK)
+    for row in range(ROWS):
+        for col in range(row % 2, COLS, 2):
+            pygame.draw.rect(background, LIGHT, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    return background
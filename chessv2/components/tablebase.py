@@ -0,0 +1,250 @@
+'''This module generates and probes endgame tablebases for king and queen, king and rook, and king and pawn
+against a lone king. Tables are built by retrograde analysis from the mates backwards and store the distance to
+mate of every position in one byte, so a table is 512 kilobytes on disk and is memory mapped for probing.
+Generate them from the repository root with: python -m chessv2.components.tablebase --help'''
+from __future__ import annotations
+import argparse
+import mmap
+import os
+import sys
+from typing import Final, NamedTuple
+from .board import Board
+from .bitboard import WHITE, BLACK, BOTH, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, SQUARE_MASKS, KING_ATTACKS, \
+    PAWN_ATTACKS, rook_attacks, queen_attacks
+from .search import MATE
+from .tables import KING_MOVES
+
+# Tables by name with the type of the strong side's extra piece, in the order they must be generated
+TABLES: Final[dict] = {'KQK': QUEEN, 'KRK': ROOK, 'KPK': PAWN}
+TABLE_SUFFIX: Final[str] = '.tb'
+# Side to move, white king, black king and extra piece squares, with white as the strong side
+TABLE_BYTES: Final[int] = 2 * 64 * 64 * 64
+# Longest distance to mate a byte can hold, in plies
+MAX_DISTANCE: Final[int] = 254
+# Count of a lone king position that can take the extra piece, high enough never to be counted down to zero
+_ESCAPE: Final[int] = 255
+
+class ProbeResult(NamedTuple):
+    '''Outcome for the side to move: wdl is 1 for a win, 0 for a draw and -1 for a loss,
+    distance is the number of plies until mate, 0 for a draw or when the side to move is already mated'''
+    wdl: int
+    distance: int
+
+DRAW: Final[ProbeResult] = ProbeResult(0, 0)
+
+def table_index(side: int, white_king: int, black_king: int, piece: int) -> int:
+    '''Returns the index of a position with white as the strong side'''
+    return side << 18 | white_king << 12 | black_king << 6 | piece
+
+def _piece_attacks(kind: int, square: int, occupied: int) -> int:
+    '''Returns the squares the white extra piece attacks'''
+    if kind == QUEEN:
+        return queen_attacks(square, occupied)
+    if kind == ROOK:
+        return rook_attacks(square, occupied)
+    return PAWN_ATTACKS[WHITE][square]
+
+def _piece_squares(kind: int) -> range:
+    '''Returns the squares the extra piece can stand on, pawns never stand on the first or last rank'''
+    return range(8, 56) if kind == PAWN else range(64)
+
+def _squares(mask: int) -> list[int]:
+    '''Returns the squares of a bitboard'''
+    squares: list[int] = []
+    while mask:
+        low: int = mask & -mask
+        squares.append(low.bit_length() - 1)
+        mask ^= low
+    return squares
+
+def generate_table(kind: int, promotions: dict[int, bytearray] = None) -> bytearray:
+    '''Builds the table of a king and one extra piece against a lone king by retrograde analysis
+    Each byte is 0 for a draw, otherwise the distance to mate in plies plus one: an odd distance is a win for
+    the side to move, an even one a loss. Pawn tables need the finished tables of the pieces they promote to'''
+    values: bytearray = bytearray(TABLE_BYTES)
+    # legal moves left for each lone king position that do not lose
+    counts: bytearray = bytearray(TABLE_BYTES)
+    buckets: list[list[int]] = [[] for _ in range(MAX_DISTANCE + 2)]
+    for white_king in range(64):
+        for black_king in range(64):
+            if black_king == white_king or SQUARE_MASKS[black_king] & KING_ATTACKS[white_king]:
+                continue
+            for piece in _piece_squares(kind):
+                if piece == white_king or piece == black_king:
+                    continue
+                # the black king is left out of the blockers since the squares behind it stay attacked
+                attacks: int = _piece_attacks(kind, piece, SQUARE_MASKS[white_king])
+                black: int = table_index(BLACK, white_king, black_king, piece)
+                moves: int = KING_ATTACKS[black_king] & ~(attacks | KING_ATTACKS[white_king] | SQUARE_MASKS[piece])
+                if SQUARE_MASKS[piece] & KING_ATTACKS[black_king] & ~KING_ATTACKS[white_king]:
+                    counts[black] = _ESCAPE
+                elif moves:
+                    counts[black] = moves.bit_count()
+                elif attacks & SQUARE_MASKS[black_king]:
+                    values[black] = 1
+                    buckets[0].append(black)
+                # promoting wins when the piece it becomes mates from there
+                if kind == PAWN and piece < 16 and not attacks & SQUARE_MASKS[black_king] \
+                        and piece - 8 != white_king and piece - 8 != black_king:
+                    for promoted in promotions.values():
+                        value: int = promoted[table_index(BLACK, white_king, black_king, piece - 8)]
+                        if value:
+                            buckets[value].append(table_index(WHITE, white_king, black_king, piece))
+    for distance in range(MAX_DISTANCE):
+        following: list[int] = buckets[distance + 1]
+        for index in buckets[distance]:
+            white_king, black_king, piece = index >> 12 & 63, index >> 6 & 63, index & 63
+            if index >> 18:
+                # the lone king is mated in distance, so every move into this position wins
+                for previous in _white_predecessors(kind, white_king, black_king, piece):
+                    if not values[previous]:
+                        following.append(previous)
+                continue
+            if values[index]:
+                continue
+            values[index] = distance + 1
+            # one fewer safe move for every lone king position that can move into this one
+            for origin in KING_MOVES[black_king]:
+                if origin == white_king or origin == piece or SQUARE_MASKS[origin] & KING_ATTACKS[white_king]:
+                    continue
+                previous = table_index(BLACK, white_king, origin, piece)
+                if counts[previous] and not values[previous]:
+                    counts[previous] -= 1
+                    if not counts[previous]:
+                        values[previous] = distance + 2
+                        following.append(previous)
+    return values
+
+def _white_predecessors(kind: int, white_king: int, black_king: int, piece: int) -> list[int]:
+    '''Returns the strong side to move positions with a move to the given lone king to move position'''
+    previous: list[int] = []
+    black_mask: int = SQUARE_MASKS[black_king]
+    for origin in KING_MOVES[white_king]:
+        if origin == black_king or origin == piece or SQUARE_MASKS[origin] & KING_ATTACKS[black_king]:
+            continue
+        if not _piece_attacks(kind, piece, SQUARE_MASKS[origin]) & black_mask:
+            previous.append(table_index(WHITE, origin, black_king, piece))
+    kings: int = SQUARE_MASKS[white_king] | black_mask
+    if kind == PAWN:
+        origins: list[int] = []
+        if piece < 48 and not SQUARE_MASKS[piece + 8] & kings:
+            origins.append(piece + 8)
+            if piece >> 3 == 4 and not SQUARE_MASKS[piece + 16] & kings:
+                origins.append(piece + 16)
+    else:
+        origins = _squares(_piece_attacks(kind, piece, kings) & ~kings)
+    for origin in origins:
+        if not _piece_attacks(kind, origin, SQUARE_MASKS[white_king]) & black_mask:
+            previous.append(table_index(WHITE, white_king, black_king, origin))
+    return previous
+
+def generate_tables(directory: str) -> dict[str, int]:
+    '''Generates every table into the directory and returns how many positions each one decides'''
+    os.makedirs(directory, exist_ok=True)
+    built: dict[int, bytearray] = {}
+    decided: dict[str, int] = {}
+    for name, kind in TABLES.items():
+        promotions: dict[int, bytearray] = {QUEEN: built[QUEEN], ROOK: built[ROOK]} if kind == PAWN else None
+        values: bytearray = generate_table(kind, promotions)
+        built[kind] = values
+        with open(os.path.join(directory, name + TABLE_SUFFIX), 'wb') as table:
+            table.write(values)
+        decided[name] = TABLE_BYTES - values.count(0)
+    return decided
+
+class Tablebase:
+    '''Memory mapped tables of a directory, any table that is missing is simply not probed'''
+    __slots__ = ('directory', 'files', 'tables')
+    directory: str
+    files: list
+    tables: dict
+    def __init__(self, directory: str) -> None:
+        '''Maps every table found in the directory read only'''
+        self.directory: str = directory
+        self.files: list = []
+        self.tables: dict = {}
+        for name, kind in TABLES.items():
+            path: str = os.path.join(directory, name + TABLE_SUFFIX)
+            if os.path.exists(path):
+                table_file: object = open(path, 'rb')
+                self.files.append(table_file)
+                self.tables[kind] = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        '''Unmaps and closes every table'''
+        for table in self.tables.values():
+            table.close()
+        for table_file in self.files:
+            table_file.close()
+        self.tables = {}
+        self.files = []
+
+    def probe(self, board: Board) -> ProbeResult | None:
+        '''Looks the position up, returning None when it is not covered. Bare kings and a lone minor piece are draws'''
+        pieces: int = board.occupancy[BOTH].bit_count()
+        if pieces == 2:
+            return DRAW
+        if pieces != 3 or board.castling:
+            return None
+        bitboards: list[int] = board.bitboards
+        for color in (WHITE, BLACK):
+            for kind in (QUEEN, ROOK, PAWN, KNIGHT, BISHOP):
+                extra: int = bitboards[color << 3 | kind]
+                if extra:
+                    break
+            else:
+                continue
+            break
+        if kind == KNIGHT or kind == BISHOP:
+            return DRAW
+        table: mmap.mmap = self.tables.get(kind)
+        if table is None:
+            return None
+        strong: int = bitboards[color << 3 | KING].bit_length() - 1
+        weak: int = bitboards[(color ^ 1) << 3 | KING].bit_length() - 1
+        piece: int = extra.bit_length() - 1
+        side: int = board.side
+        if color == BLACK:
+            # mirror the ranks so the strong side is white
+            strong, weak, piece, side = strong ^ 56, weak ^ 56, piece ^ 56, side ^ 1
+        value: int = table[table_index(side, strong, weak, piece)]
+        if not value:
+            return DRAW
+        return ProbeResult(1 if value & 1 == 0 else -1, value - 1)
+
+    def probe_score(self, board: Board, ply: int) -> int | None:
+        '''Returns the search score of the position at ply, a mate score from the table, or None'''
+        result: ProbeResult | None = self.probe(board)
+        if result is None or not result.wdl:
+            return None if result is None else 0
+        return MATE - ply - result.distance if result.wdl > 0 else -MATE + ply + result.distance
+
+def main(argv: list[str] = None) -> int:
+    '''Parses the command line and generates the tables or probes a position'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Endgame tablebase generator and prober')
+    commands: argparse._SubParsersAction = parser.add_subparsers(dest='command', required=True)
+    generate: argparse.ArgumentParser = commands.add_parser('generate', help='generate every table')
+    generate.add_argument('directory', help='directory to write the tables to')
+    probe: argparse.ArgumentParser = commands.add_parser('probe', help='look up a position')
+    probe.add_argument('directory', help='directory holding the tables')
+    probe.add_argument('fen', help='position to look up')
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.command == 'generate':
+        for name, decided in generate_tables(args.directory).items():
+            print(f'{name}: {decided} positions decided')
+        return 0
+    board: Board = Board(views=False)
+    board.fen_to_board(args.fen, views=False)
+    tablebase: Tablebase = Tablebase(args.directory)
+    result: ProbeResult | None = tablebase.probe(board)
+    tablebase.close()
+    if result is None:
+        print('not in the tablebase')
+    elif not result.wdl:
+        print('draw')
+    else:
+        print(f"{'win' if result.wdl > 0 else 'loss'} for the side to move, mate in {result.distance} plies")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
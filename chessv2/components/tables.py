@@ -0,0 +1,62 @@
+'''This module stores the lookup tables used for move generation
+The tables are built once at import so move generation only has to walk them'''
+from __future__ import annotations
+from typing import Final
+
+__all__ = ("NORTH", "SOUTH", "WEST", "EAST", "NORTH_WEST", "NORTH_EAST", "SOUTH_WEST", "SOUTH_EAST",
+"ROOK_DIRECTIONS", "BISHOP_DIRECTIONS", "QUEEN_DIRECTIONS", "DIRECTION_OFFSETS",
+"KNIGHT_MOVES", "KING_MOVES", "RAYS")
+
+# Square 0 is a8 and square 63 is h1, so north (towards black) is -8
+NORTH: Final[int] = 0
+SOUTH: Final[int] = 1
+WEST: Final[int] = 2
+EAST: Final[int] = 3
+NORTH_WEST: Final[int] = 4
+NORTH_EAST: Final[int] = 5
+SOUTH_WEST: Final[int] = 6
+SOUTH_EAST: Final[int] = 7
+
+ROOK_DIRECTIONS: Final[tuple] = (NORTH, SOUTH, WEST, EAST)
+BISHOP_DIRECTIONS: Final[tuple] = (NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST)
+QUEEN_DIRECTIONS: Final[tuple] = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# (row, col) steps indexed by direction, and the matching 0-63 offsets
+_DIRECTION_STEPS: Final[tuple] = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+DIRECTION_OFFSETS: Final[tuple] = tuple(row * 8 + col for row, col in _DIRECTION_STEPS)
+_KNIGHT_STEPS: Final[tuple] = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+def _on_board(row: int, col: int) -> bool:
+    '''Returns True if the row and column are inside the board'''
+    return 0 <= row < 8 and 0 <= col < 8
+
+def _build_step_table(steps: tuple) -> tuple:
+    '''Builds the target squares for a piece that moves a single step in each direction'''
+    table: list = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        targets: list[int] = [(row + d_row) * 8 + col + d_col for d_row, d_col in steps
+                              if _on_board(row + d_row, col + d_col)]
+        table.append(tuple(targets))
+    return tuple(table)
+
+def _build_rays() -> tuple:
+    '''Builds the squares a slider passes through from each square in each direction, nearest first'''
+    table: list = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        square_rays: list = []
+        for d_row, d_col in _DIRECTION_STEPS:
+            ray: list[int] = []
+            ray_row, ray_col = row + d_row, col + d_col
+            while _on_board(ray_row, ray_col):
+                ray.append(ray_row * 8 + ray_col)
+                ray_row += d_row
+                ray_col += d_col
+            square_rays.append(tuple(ray))
+        table.append(tuple(square_rays))
+    return tuple(table)
+
+KNIGHT_MOVES: Final[tuple] = _build_step_table(_KNIGHT_STEPS)
+KING_MOVES: Final[tuple] = _build_step_table(_DIRECTION_STEPS)
+RAYS: Final[tuple] = _build_rays()
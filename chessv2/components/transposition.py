@@ -0,0 +1,98 @@
+'''This module stores the transposition table used by the search
+The table is two flat arrays allocated once, so its memory stays the same however long the game runs'''
+from __future__ import annotations
+from array import array
+from typing import Final
+
+EXACT: Final[int] = 0
+LOWER: Final[int] = 1
+UPPER: Final[int] = 2
+
+# Each entry is a 64 bit key and a 64 bit packed record
+ENTRY_BYTES: Final[int] = 16
+# Scores are stored offset so they pack as unsigned
+_SCORE_OFFSET: Final[int] = 1 << 23
+
+class TranspositionTable:
+    '''Fixed size table of search results keyed by zobrist key
+    Entries sit in buckets of two: the first slot keeps the deepest result of the current search,
+    the second always takes the newest result'''
+    __slots__ = ('size', 'mask', 'keys', 'records', 'age', 'hits', 'misses', 'collisions', 'stores')
+    size: int
+    mask: int
+    keys: array
+    records: array
+    age: int
+    hits: int
+    misses: int
+    collisions: int
+    stores: int
+    def __init__(self, megabytes: float = 16) -> None:
+        '''Sizes the table to the largest power of two bucket count that fits in the memory cap'''
+        buckets: int = 1
+        while buckets * 4 * ENTRY_BYTES <= megabytes * 1024 * 1024:
+            buckets *= 2
+        self.size: int = buckets * 2
+        self.mask: int = buckets - 1
+        self.keys: array = array('Q', bytes(self.size * 8))
+        self.records: array = array('Q', bytes(self.size * 8))
+        self.age: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.collisions: int = 0
+        self.stores: int = 0
+
+    def clear(self) -> None:
+        '''Empties the table and resets the counters'''
+        self.keys = array('Q', bytes(self.size * 8))
+        self.records = array('Q', bytes(self.size * 8))
+        self.age = 0
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def new_search(self) -> None:
+        '''Ages the table so entries from earlier searches are replaced first'''
+        self.age = self.age + 1 & 255
+
+    def probe(self, key: int) -> tuple[int, int, int, int] | None:
+        '''Returns the move, depth, bound and score stored for a key, or None'''
+        slot: int = (key & self.mask) << 1
+        keys: array = self.keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                self.misses += 1
+                if keys[slot] or keys[slot - 1]:
+                    self.collisions += 1
+                return None
+        record: int = self.records[slot]
+        if not record:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record & 0xFFFF, record >> 16 & 0xFF, record >> 24 & 3, (record >> 34) - _SCORE_OFFSET
+
+    def store(self, key: int, move: int, depth: int, bound: int, score: int) -> None:
+        '''Stores a search result, keeping the deeper or newer entry in the bucket's first slot'''
+        slot: int = (key & self.mask) << 1
+        keys: array = self.keys
+        records: array = self.records
+        first: int = records[slot]
+        if keys[slot] == key or not first or (first >> 26 & 0xFF) != self.age or depth >= (first >> 16 & 0xFF):
+            if keys[slot] == key and not move:
+                move = first & 0xFFFF
+        else:
+            slot += 1
+        self.stores += 1
+        keys[slot] = key
+        # the bucket's record is never 0 once written because the score offset is always set
+        records[slot] = move | min(depth, 255) << 16 | bound << 24 | self.age << 26 | score + _SCORE_OFFSET << 34
+
+    def usage(self) -> float:
+        '''Returns the share of slots written during the current search, sampled from the first thousand'''
+        sample: int = min(self.size, 1000)
+        used: int = sum(1 for slot in range(sample) if self.records[slot] and self.records[slot] >> 26 & 0xFF == self.age)
+        return used / sample
+
+    def memory(self) -> int:
+        '''Returns the bytes held by the table'''
+        return self.keys.itemsize * len(self.keys) + self.records.itemsize * len(self.records)
@@ -0,0 +1,32 @@
+'''This module stores the zobrist keys used to hash board positions'''
+from __future__ import annotations
+from random import Random
+from typing import Final
+
+__all__ = ("PIECE_KEYS", "SIDE_KEY", "CASTLING_KEYS", "EP_KEYS", "compute_hash")
+
+# A fixed seed keeps hashes stable between runs so they can be stored on disk
+_rng: Random = Random(0x5A0B1157)
+
+# Indexed by piece code then square, unused codes hash to nothing
+PIECE_KEYS: Final[tuple] = tuple(
+    tuple(_rng.getrandbits(64) for _ in range(64)) if code & 7 and code & 7 <= 6 else (0,) * 64
+    for code in range(16))
+# Xored in when black is to move
+SIDE_KEY: Final[int] = _rng.getrandbits(64)
+# Indexed by the full 4 bit castling mask so a change of rights is two xors
+CASTLING_KEYS: Final[tuple] = (0,) + tuple(_rng.getrandbits(64) for _ in range(15))
+# Indexed by the file of the en passant square
+EP_KEYS: Final[tuple] = tuple(_rng.getrandbits(64) for _ in range(8))
+
+def compute_hash(board: object) -> int:
+    '''Hashes a board from scratch, used when loading a position and to check the incremental key'''
+    key: int = CASTLING_KEYS[board.castling]
+    if board.side:
+        key ^= SIDE_KEY
+    if board.ep_square != -1:
+        key ^= EP_KEYS[board.ep_square & 7]
+    for square, code in enumerate(board.squares):
+        if code:
+            key ^= PIECE_KEYS[code][square]
+    return key
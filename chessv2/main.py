@@ -1,14 +1,24 @@
-'''This file is used to run the game and to handle player mouse inputs'''
+'''This file is used to run the game and to handle player mouse inputs
+With --metrics F10 prints the counters and timings so far, F9 starts and stops the profiler at any time'''
 from __future__ import annotations
+import argparse
+import sys
 from typing import Final
 import pygame
 from pygame import Surface
-from components.game import Game
+from components.game import Game, ENGINE_EVENT
+from components.parallel import default_workers
 from components.constants import WIDTH, HEIGHT, SQUARE_SIZE
+from components.metrics import METRICS, configure_logging
 
 FPS: Final[int] = 60
-WIN: Final[Surface] = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Chess")
+# Longest the event driven loop sleeps before waking up on its own, in milliseconds
+IDLE_TIMEOUT: Final[int] = 1000
+# The only events that change the game, everything else such as mouse motion is blocked so it cannot wake the loop
+HANDLED_EVENTS: Final[tuple] = (pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.WINDOWEXPOSED, ENGINE_EVENT)
+# Keys that toggle the profiler and print the metrics while the game runs
+PROFILE_KEY: Final[int] = pygame.K_F9
+METRICS_KEY: Final[int] = pygame.K_F10
 
 def get_pos_from_mouse(pos: tuple[int, int]) -> int:
     '''Returns the array position of user mouse click'''
@@ -18,21 +28,77 @@ def get_pos_from_mouse(pos: tuple[int, int]) -> int:
     array_pos: int = row * 8 + col
     return array_pos
 
+def handle_event(game: Game, event: pygame.event.Event) -> bool:
+    '''Applies one event to the game, returns False when the window was closed'''
+    if event.type == pygame.QUIT:
+        return False
+    if event.type == pygame.WINDOWEXPOSED:
+        game.renderer.invalidate()
+    if event.type == pygame.MOUSEBUTTONDOWN:
+        selected_pos = get_pos_from_mouse(event.pos)
+        game.select(selected_pos)
+    if event.type == ENGINE_EVENT:
+        game.handle_engine_event(event)
+    if event.type == pygame.KEYDOWN:
+        handle_key(event.key)
+    return True
+
+def handle_key(key: int) -> None:
+    '''Toggles the profiler, printing its statistics when it stops, or prints the metrics gathered so far'''
+    if key == PROFILE_KEY:
+        if METRICS.profiling:
+            print(METRICS.stop_profile(), file=sys.stderr)
+        else:
+            METRICS.start_profile()
+    elif key == METRICS_KEY and METRICS.enabled:
+        print(METRICS.report(), file=sys.stderr)
+
 def main() -> None:
-    '''Handles the main game loop'''
+    '''Handles the main game loop, the window is only opened once the game starts
+    By default the loop sleeps until an event arrives, --poll keeps the old fixed frame rate loop'''
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Chess')
+    parser.add_argument('--ai', choices=('white', 'black'), help='let the engine play this color')
+    parser.add_argument('--think-time', type=float, default=1.0, help='seconds the engine may spend per move')
+    parser.add_argument('--workers', type=int, default=1, help='processes the engine searches with, 0 uses every core')
+    parser.add_argument('--book', help='opening book file the engine plays from, see components/book.py')
+    parser.add_argument('--poll', action='store_true', help=f'poll for events {FPS} times a second')
+    parser.add_argument('--metrics', action='store_true', help='count move generations, checks, moves and frame times')
+    parser.add_argument('--profile', action='store_true', help='profile from the start, F9 stops and prints the profile')
+    parser.add_argument('--log-level', default='WARNING', help='lowest level of log records to show, e.g. DEBUG')
+    args: argparse.Namespace = parser.parse_args()
+    configure_logging(args.log_level)
+    METRICS.enable(args.metrics)
+    if args.profile:
+        METRICS.start_profile()
+    win: Surface = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Chess")
     run: bool = True
     clock: Final[pygame.time.Clock] = pygame.time.Clock()
-    game:object = Game(WIN)
-    while run:
-        clock.tick(FPS)
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                pos = pygame.mouse.get_pos()
-                selected_pos = get_pos_from_mouse(pos)
-                game.select(selected_pos)
+    game:object = Game(win, args.ai, args.think_time, workers=args.workers or default_workers(),
+                       book=args.book)
+    # the engine process of a multi worker game only exits once close() tells it to
+    try:
+        if not args.poll:
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(HANDLED_EVENTS)
         game.update()
-    pygame.quit()
+        while run:
+            if args.poll:
+                clock.tick(FPS)
+                events: list = pygame.event.get()
+            else:
+                # sleep until something happens, then take whatever else queued up in the meantime
+                events = [pygame.event.wait(IDLE_TIMEOUT)] + pygame.event.get()
+            for event in events:
+                run = handle_event(game, event) and run
+            game.update()
+    finally:
+        game.close()
+        pygame.quit()
+    if METRICS.enabled:
+        print(METRICS.report(), file=sys.stderr)
+    if METRICS.profiling:
+        print(METRICS.stop_profile(), file=sys.stderr)
 
-main()
+if __name__ == '__main__':
+    main()